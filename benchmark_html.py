@@ -0,0 +1,196 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+from paper_download import SciHubUrls, getSchiHubPDF
+
+# Each kind of page and the parser that reads it; every parser takes fast=False for the full BeautifulSoup parse.
+PARSERS = {
+    'landing': getSchiHubPDF,
+    'mirrors': SciHubUrls,
+}
+
+WORDS = ["methylation", "promoter", "tumor", "cohort", "biomarker", "patient", "sequencing", "expression", "gene",
+         "analysis", "clinical", "survival", "cancer", "DNA", "association", "study", "risk", "marker"]
+
+
+def filler(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def page_head(rng):
+    # Scripts and comments quote the tags the scanners look for, which only
+    # a tokenizer (not a plain text search) gets right.
+    return (f"<!DOCTYPE html><html><head><title>{filler(rng, 5)}</title>"
+            f"<style>{'body { margin: 0; } ' * rng.randint(50, 400)}</style>"
+            f"<script>var tpl = '<iframe id=\"pdf\" src=\"/decoy.pdf\"></iframe>'; {'var x = 1; ' * rng.randint(50, 400)}</script>"
+            f"<!-- <embed id=\"plugin\" src=\"/decoy-comment.pdf\"> --></head><body>")
+
+
+def navigation(rng):
+    links = ''.join(f'<li><a href="/{rng.choice(WORDS)}">{filler(rng, 2)}</a></li>' for _ in range(rng.randint(3, 12)))
+    return f'<div id="menu"><ul>{links}</ul></div>'
+
+
+def landing_page(rng):
+    """Sci-Hub article page: the PDF in an iframe or embed, or a not-found message."""
+    body = [navigation(rng), f"<div id=\"citation\">{filler(rng, 30)}</div>"]
+    variant = rng.randrange(7)
+    src = f"//{rng.choice(['zero', 'moscow', 'twin'])}.sci-hub.se/{rng.randint(1000, 9999)}/{rng.getrandbits(64):x}/paper.pdf"
+    if variant == 0:
+        body.append(f'<div id="article"><iframe id="pdf" src="{src}#navpanes=0&amp;view=FitH"></iframe></div>')
+    elif variant == 1:
+        body.append(f'<div id="article"><embed type="application/pdf" id="plugin" src="{src}#view=FitH"></div>')
+    elif variant == 2:
+        body.append(f'<iframe id="pdf"></iframe><embed id="plugin" src="https://{src[2:]}">')
+    elif variant == 3:
+        body.append(f"<IFRAME ID=pdf SRC='{src}'></IFRAME>")
+    elif variant == 4:
+        body.append(f'<embed id="plugin" src="{src}"><iframe src="/ads" id="pdf-viewer"></iframe>')
+    else:
+        body.append(f"<p>{filler(rng, 20)}</p><p>article not found</p>")
+    body.append(''.join(f"<p>{filler(rng, 40)}</p>" for _ in range(rng.randint(5, 40))))
+    return page_head(rng) + ''.join(body) + "</body></html>"
+
+
+def mirrors_page(rng):
+    """Mirror list page: sci-hub links mixed with others, sometimes in nested or unclosed lists."""
+    def link():
+        if rng.random() < 0.6:
+            return f'<a href="{rng.choice(["HTTPS", "HTTP"])}://sci-hub.{rng.choice(["se", "ru", "st", "wf"])}/">mirror</a>'
+        return f'<a href="https://{rng.choice(WORDS)}.org/">{filler(rng, 2)}</a>'
+
+    lists = []
+    for _ in range(rng.randint(1, 4)):
+        items = ''.join(f"<li>{link()}</li>" for _ in range(rng.randint(2, 10)))
+        if rng.random() < 0.2:
+            items += f"<li><ul>{''.join(f'<li>{link()}</li>' for _ in range(3))}</ul></li>"
+        if rng.random() < 0.2:
+            # An unclosed list, ended by its enclosing </div>: the links after it are outside.
+            lists.append(f"<div><ul>{items}</div>{link()}<p>{filler(rng, 30)}</p>")
+        else:
+            lists.append(f"<ul>{items}</ul><p>{filler(rng, 30)}</p>")
+    return page_head(rng) + f"<a href=\"HTTPS://sci-hub.outside/\">top</a>{''.join(lists)}</body></html>"
+
+
+GENERATORS = {
+    'landing': landing_page,
+    'mirrors': mirrors_page,
+}
+
+
+def generate_fixtures(directory, pages, seed=0):
+    """Write pages reproducible pages of every kind as <kind>-NNNN.html."""
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    rng = random.Random(seed)
+    for kind, generate in GENERATORS.items():
+        for i in range(pages):
+            with open(os.path.join(directory, f"{kind}-{i:04d}.html"), 'w', encoding='utf-8') as f:
+                f.write(generate(rng))
+
+
+def load_pages(directory):
+    """
+    Returns:
+        dict: kind -> list of (filename, html); files not named <kind>-*.html are read under every kind
+    """
+    pages = {kind: [] for kind in PARSERS}
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.html'):
+            continue
+        with open(os.path.join(directory, name), 'r', encoding='utf-8', errors='replace') as f:
+            html = f.read()
+        kind = name.split('-', 1)[0]
+        for page_kind in ([kind] if kind in PARSERS else PARSERS):
+            pages[page_kind].append((name, html))
+    return pages
+
+
+def check(pages):
+    """
+    Compare the fast path of every parser with the full parse.
+
+    Returns:
+        list: (kind, filename, fast result, full result) of every page where they differ
+    """
+    mismatches = []
+    for kind, parser in PARSERS.items():
+        for name, html in pages[kind]:
+            fast, full = parser(html), parser(html, fast=False)
+            if fast != full:
+                mismatches.append((kind, name, fast, full))
+    return mismatches
+
+
+def bench(pages, repeat=3):
+    """Best-of-repeat pages per second of the fast and full paths of every parser."""
+    results = {}
+    for kind, parser in PARSERS.items():
+        if not pages[kind]:
+            continue
+        htmls = [html for _, html in pages[kind]]
+        timings = {}
+        for path, fast in (('fast', True), ('full', False)):
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                for html in htmls:
+                    parser(html, fast=fast)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            timings[path] = best
+        results[kind] = {
+            'pages': len(htmls),
+            'mb': sum(len(html) for html in htmls) / (1024 * 1024),
+            'fast_pages_per_second': len(htmls) / timings['fast'] if timings['fast'] else None,
+            'full_pages_per_second': len(htmls) / timings['full'] if timings['full'] else None,
+            'speedup': timings['full'] / timings['fast'] if timings['fast'] else None,
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark and cross-check the fast HTML extraction of paper_download.py.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    generate_parser = subparsers.add_parser('generate', help='Write synthetic fixture pages.')
+    generate_parser.add_argument('--fixtures', type=str, required=True, help='Folder for the pages.')
+    generate_parser.add_argument('--pages', type=int, default=200, help='Pages of each kind.')
+    generate_parser.add_argument('--seed', type=int, default=0, help='Seed of the page generator.')
+
+    check_parser = subparsers.add_parser('check', help='Check that the fast and full parses agree on every page.')
+    check_parser.add_argument('--fixtures', type=str, required=True, help='Folder of generated or saved .html pages.')
+
+    bench_parser = subparsers.add_parser('bench', help='Time the fast and full parses.')
+    bench_parser.add_argument('--fixtures', type=str, required=True, help='Folder of generated or saved .html pages.')
+    bench_parser.add_argument('--repeat', type=int, default=3, help='Timed passes over the pages; the best is kept.')
+    bench_parser.add_argument('--output', type=str, default=None, help='JSON file for the results.')
+    args = parser.parse_args()
+
+    if args.command == 'generate':
+        generate_fixtures(args.fixtures, args.pages, args.seed)
+        return
+
+    pages = load_pages(args.fixtures)
+    mismatches = check(pages)
+    for kind, name, fast, full in mismatches:
+        print(f"{kind} {name}: fast {fast!r} != full {full!r}")
+    if args.command == 'check':
+        print(f"{sum(len(kind_pages) for kind_pages in pages.values()) - len(mismatches)} pages agree, {len(mismatches)} differ")
+        sys.exit(1 if mismatches else 0)
+
+    results = bench(pages, args.repeat)
+    for kind, result in results.items():
+        print(f"{kind}: {result['pages']} pages, {result['fast_pages_per_second']:.0f} pages/s fast, "
+              f"{result['full_pages_per_second']:.0f} pages/s full, {result['speedup']:.1f}x")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'mismatches': len(mismatches), 'results': results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import platform
+import subprocess
+import multiprocessing
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from corpus_pack import pack_directory
+from doc_signatures import build_signatures, save_signatures, signature_path
+from query_grid import QueryGrid
+from search import evaluate_query
+from search_engine import search_to_matrix
+
+BENCHMARK_VERSION = 1
+DEFAULT_SCALES = [1000, 10000, 100000]
+
+GENES = ["GSTP1", "HOXA9", "MLH1", "MSH2", "PTEN", "RASSF1", "RUNX3", "APC", "BRCA1", "CDKN2A", "CDH1", "DAPK1",
+         "ESR1", "MGMT", "RARB", "SEPT9", "SFRP1", "SOX17", "TIMP3", "VHL"]
+DISEASES = ["Breast cancer", "Colorectal cancer", "Lung cancer", "Melanoma", "Prostate cancer", "Gastric cancer",
+            "Ovarian cancer", "Bladder cancer", "Glioma", "Leukemia"]
+METHODS = ["sequencing", "PCR", "microarray", "pyrosequencing", "immunohistochemistry"]
+PHRASES = ["DNA methylation", "patient", "promoter hypermethylation", "tumor suppressor", "cohort", "biomarker"]
+SYLLABLES = ["ab", "ac", "al", "an", "ar", "at", "be", "ce", "ci", "co", "de", "di", "en", "er", "es", "ex", "ge", "ic",
+             "in", "is", "la", "le", "li", "lo", "ma", "me", "mi", "na", "ne", "no", "or", "pa", "pe", "po", "ra", "re",
+             "ri", "ro", "se", "si", "ta", "te", "ti", "to", "tr", "un", "va", "ve", "vi"]
+
+
+def benchmark_queries(genes=7, diseases=5, methods=3):
+    """Gene x disease x fixed terms x method grid shaped like the one in search.py."""
+    return QueryGrid([GENES[:genes], DISEASES[:diseases], "DNA methylation", "patient", METHODS[:methods]])
+
+
+def zipf_weights(count, exponent=1.1):
+    return [1 / (rank + 1) ** exponent for rank in range(count)]
+
+
+def generate_corpus(directory, documents, seed=0, mean_kb=8):
+    """
+    Write a reproducible synthetic corpus of .txt papers.
+
+    File sizes follow a log-normal distribution around mean_kb, so a few
+    papers are much larger than most. Filler words come from a seeded
+    vocabulary; genes, diseases, methods and fixed phrases are mixed in with
+    Zipf-distributed frequencies, so popular genes appear in many papers and
+    most gene x disease pairs in few. Papers are spread over DOI-like
+    subfolders. An existing corpus with the same parameters is reused.
+
+    Returns:
+        dict: The corpus manifest (documents, seed, mean_kb, bytes)
+    """
+    manifest_path = os.path.join(directory, 'corpus.json')
+    settings = {'version': BENCHMARK_VERSION, 'documents': documents, 'seed': seed, 'mean_kb': mean_kb}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if all(manifest.get(key) == value for key, value in settings.items()):
+            return manifest
+
+    rng = random.Random(seed)
+    vocabulary = sorted({''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 5))) for _ in range(20000)})
+    vocabulary_weights = zipf_weights(len(vocabulary), 1.0)
+    mentions = [(GENES, zipf_weights(len(GENES))), (DISEASES, zipf_weights(len(DISEASES))),
+                (METHODS, zipf_weights(len(METHODS))), (PHRASES, zipf_weights(len(PHRASES), 0.5))]
+    # Log-normal sizes with sigma 1 have mean exp(mu + 1/2).
+    mu = math.log(mean_kb * 1024) - 0.5
+
+    total_bytes = 0
+    for i in range(documents):
+        size = max(int(rng.lognormvariate(mu, 1.0)), 200)
+        words = rng.choices(vocabulary, vocabulary_weights, k=size // 6)
+        for terms, weights in mentions:
+            for term in rng.choices(terms, weights, k=rng.randint(0, 4)):
+                words.insert(rng.randrange(len(words) + 1), term)
+        for k in range(rng.randrange(20, 60), len(words), rng.randrange(20, 60)):
+            words[k] += '.'
+        text = ' '.join(words)
+
+        folder = os.path.join(directory, f"10.{1000 + i % 50}")
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        with open(os.path.join(folder, f"paper.{i:06d}.txt"), 'w', encoding='utf-8') as f:
+            f.write(text)
+        total_bytes += len(text.encode('utf-8'))
+
+    manifest = dict(settings, bytes=total_bytes)
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    return manifest
+
+
+def prepare_corpus(directory, processes=None):
+    """Build the pack and signatures that the pack and signatures modes search."""
+    timings = {}
+    pack_path = directory.rstrip(os.sep) + '.pack'
+    if not os.path.exists(pack_path):
+        start = time.perf_counter()
+        pack_directory(directory, pack_path)
+        timings['pack_seconds'] = time.perf_counter() - start
+    signatures_path = signature_path(directory)
+    if not os.path.exists(signatures_path):
+        start = time.perf_counter()
+        save_signatures(build_signatures(directory, processes=processes), signatures_path)
+        timings['signatures_seconds'] = time.perf_counter() - start
+    return timings
+
+
+# Each mode is (corpus suffix, pass the grid rather than its query strings,
+# search_to_matrix options); the suffix selects the folder or its .pack.
+MODES = {
+    'regex': ('', False, {'engine': 'regex'}),
+    'aho-corasick': ('', False, {'engine': 'aho-corasick'}),
+    'grid': ('', True, {}),
+    'pack': ('.pack', True, {}),
+    'signatures': ('', True, {'signatures': True}),
+}
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process and of its largest worker, in MiB."""
+    if resource is None:
+        return None, None
+    # ru_maxrss is in KiB on Linux and in bytes on macOS.
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale)
+
+
+def run_mode(directory, mode, processes=None, sample=50):
+    """
+    Time one mode over the corpus in the current process.
+
+    Returns:
+        dict: Throughput, per-query latency and peak memory of the run
+    """
+    suffix, use_grid, options = MODES[mode]
+    corpus = directory.rstrip(os.sep) + suffix
+    options = dict(options)
+    if options.get('signatures'):
+        options['signatures'] = signature_path(directory)
+    grid = benchmark_queries()
+    queries = grid if use_grid else list(grid)
+    with open(os.path.join(directory, 'corpus.json'), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    start = time.perf_counter()
+    matrix, files, _ = search_to_matrix(corpus, queries, processes=processes, **options)
+    seconds = time.perf_counter() - start
+    while multiprocessing.active_children():
+        time.sleep(0.01)
+
+    # Single-query latency of evaluate_query, on a fixed sample of papers.
+    rng = random.Random(0)
+    paths = sorted(os.path.join(root, file) for root, dirs, names in os.walk(directory) for file in names if file.endswith('.txt'))
+    sample_paths = rng.sample(paths, min(sample, len(paths)))
+    sample_queries = list(grid)[:5]
+    contents = []
+    for path in sample_paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            contents.append(f.read())
+    start = time.perf_counter()
+    for content in contents:
+        for query in sample_queries:
+            evaluate_query(content, query)
+    evaluate_seconds = time.perf_counter() - start
+
+    main_rss, worker_rss = peak_rss_mb()
+    return {
+        'mode': mode,
+        'documents': len(files),
+        'queries': len(grid),
+        'bytes': manifest['bytes'],
+        'seconds': seconds,
+        'files_per_second': len(files) / seconds,
+        'mb_per_second': manifest['bytes'] / (1024 * 1024) / seconds,
+        'ms_per_query': seconds * 1000 / len(grid),
+        'evaluate_query_ms': evaluate_seconds * 1000 / max(len(contents) * len(sample_queries), 1),
+        'nonzero_counts': int((matrix > 0).sum()),
+        'peak_rss_mb': main_rss,
+        'peak_worker_rss_mb': worker_rss,
+    }
+
+
+def run_isolated(directory, mode, processes=None):
+    """Run a mode in a fresh interpreter, so peak memory is not shared between modes."""
+    command = [sys.executable, os.path.abspath(__file__), 'run', '--corpus', directory, '--mode', mode]
+    if processes:
+        command += ['--processes', str(processes)]
+    completed = subprocess.run(command, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Mode {mode} failed on {directory}:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def compare(results, baseline):
+    """Print the change in files/s of every (documents, mode) pair present in both runs."""
+    previous = {(run['documents'], run['mode']): run for run in baseline['runs']}
+    for run in results['runs']:
+        before = previous.get((run['documents'], run['mode']))
+        if before is not None:
+            change = run['files_per_second'] / before['files_per_second'] - 1
+            print(f"{run['documents']:>7} docs {run['mode']:<13} {run['files_per_second']:10.1f} files/s ({change:+.1%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the search engine on synthetic corpora.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    bench_parser = subparsers.add_parser('bench', help='Generate corpora and time every mode on each.')
+    bench_parser.add_argument('--workdir', type=str, required=True, help='Folder for the generated corpora.')
+    bench_parser.add_argument('--scales', type=int, nargs='*', default=DEFAULT_SCALES, help='Corpus sizes in documents.')
+    bench_parser.add_argument('--modes', type=str, nargs='*', default=list(MODES), choices=list(MODES), help='Modes to time.')
+    bench_parser.add_argument('--mean-kb', type=float, default=8, help='Mean paper size in KiB.')
+    bench_parser.add_argument('--seed', type=int, default=0, help='Seed of the corpus generator.')
+    bench_parser.add_argument('--processes', type=int, default=None, help='Worker processes, defaults to the number of cores.')
+    bench_parser.add_argument('--output', type=str, default=None, help='JSON file for the results.')
+    bench_parser.add_argument('--compare', type=str, default=None, help='Earlier results JSON to compare files/s against.')
+
+    run_parser = subparsers.add_parser('run', help='Time one mode on an existing corpus and print JSON.')
+    run_parser.add_argument('--corpus', type=str, required=True, help='Generated corpus folder.')
+    run_parser.add_argument('--mode', type=str, required=True, choices=list(MODES), help='Mode to time.')
+    run_parser.add_argument('--processes', type=int, default=None, help='Worker processes, defaults to the number of cores.')
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        print(json.dumps(run_mode(args.corpus, args.mode, args.processes)))
+        return
+
+    results = {
+        'version': BENCHMARK_VERSION,
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                    'processor': platform.processor(), 'cpu_count': os.cpu_count(), 'processes': args.processes},
+        'settings': {'seed': args.seed, 'mean_kb': args.mean_kb},
+        'corpora': [],
+        'runs': [],
+    }
+    for documents in args.scales:
+        directory = os.path.join(args.workdir, f"corpus_{documents}_{args.seed}_{args.mean_kb:g}kb")
+        start = time.perf_counter()
+        manifest = generate_corpus(directory, documents, args.seed, args.mean_kb)
+        corpus = dict(manifest, generate_seconds=time.perf_counter() - start)
+        corpus.update(prepare_corpus(directory, args.processes))
+        results['corpora'].append(corpus)
+        for mode in args.modes:
+            run = run_isolated(directory, mode, args.processes)
+            results['runs'].append(run)
+            print(f"{documents:>7} docs {mode:<13} {run['files_per_second']:10.1f} files/s {run['mb_per_second']:8.1f} MB/s "
+                  f"{run['ms_per_query']:8.2f} ms/query  peak RSS {run['peak_rss_mb'] or 0:.0f} MiB")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print("Results have been saved to JSON at:", args.output)
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+import os
+import csv
+import time
+import argparse
+import multiprocessing
+from multiprocessing import cpu_count
+from multiprocessing.connection import wait
+
+try:
+    import pymupdf
+except ImportError:
+    pymupdf = None
+
+from pdf_store import PdfStore
+
+TIMEOUT = 120
+LOG_NAME = 'conversion_log.csv'
+
+
+def pdf_tasks(pdf_dir, txt_dir):
+    """(PDF path, TXT path) of every .pdf under pdf_dir, with the folder layout mirrored under txt_dir."""
+    tasks = []
+    for root, dirs, files in os.walk(pdf_dir):
+        for file in files:
+            if file.lower().endswith('.pdf'):
+                rel_path = os.path.relpath(os.path.join(root, file), pdf_dir)
+                tasks.append((os.path.join(root, file), os.path.join(txt_dir, os.path.splitext(rel_path)[0] + '.txt')))
+    return tasks
+
+
+def store_tasks(store_dir, txt_dir):
+    """
+    (PDF path, TXT path) of every PDF of a pdf_store.py store, once per content.
+
+    Each text file is named after the first DOI stored with the PDF and
+    sharded like the store's objects, so DOIs sharing a PDF are converted
+    and searched once.
+    """
+    with PdfStore(store_dir) as store:
+        return [(path, os.path.join(txt_dir, sha256[:2], sha256[2:4], names[0] + '.txt'))
+                for sha256, path, names in store.unique()]
+
+
+def up_to_date(pdf_path, txt_path):
+    return os.path.exists(txt_path) and os.path.getmtime(txt_path) >= os.path.getmtime(pdf_path)
+
+
+def convert_file(pdf_path, txt_path):
+    """
+    Write the text of every page of a PDF to txt_path, one page after another.
+
+    The text goes to a temporary file renamed into place, so a killed
+    conversion never leaves a partial .txt that looks up to date.
+
+    Returns:
+        int: Number of pages
+    """
+    folder = os.path.dirname(txt_path)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder, exist_ok=True)
+    tmp_path = txt_path + '.tmp'
+    with pymupdf.open(pdf_path) as doc, open(tmp_path, 'w', encoding='utf-8') as f:
+        pages = doc.page_count
+        for page in doc:
+            f.write(page.get_text())
+            f.write('\n')
+    os.replace(tmp_path, txt_path)
+    return pages
+
+
+def convert_worker(conn):
+    """Convert the tasks received on conn and send back each result, until it receives None."""
+    while True:
+        task = conn.recv()
+        if task is None:
+            return
+        pdf_path, txt_path = task
+        start = time.perf_counter()
+        try:
+            pages = convert_file(pdf_path, txt_path)
+            conn.send(('converted', pages, time.perf_counter() - start, None))
+        except Exception as e:
+            conn.send(('error', None, time.perf_counter() - start, str(e)))
+
+
+class ConvertWorker:
+    """
+    A worker process with its own pipe, so the parent knows what it is
+    converting and since when, and killing it cannot corrupt a queue that
+    other workers write to.
+    """
+
+    def __init__(self):
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=convert_worker, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.task = None
+        self.started = None
+
+    def assign(self, task):
+        self.task = task
+        self.started = time.monotonic()
+        self.conn.send(task)
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            # The worker has already exited.
+            pass
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+def convert_pdfs(tasks, processes=None, timeout=TIMEOUT, force=False, log_path=None):
+    """
+    Convert PDFs to text in worker processes, skipping those whose text is up to date.
+
+    A conversion running longer than timeout seconds, or whose worker
+    crashes, has its worker killed and replaced, and is logged as failed.
+    Every finished file is appended to log_path with its page count and
+    conversion time.
+
+    Args:
+        tasks (list): (PDF path, TXT path) pairs, as given by pdf_tasks or store_tasks
+        processes (int): Conversions running at once, defaults to cpu_count()
+        timeout (float): Seconds one PDF may take
+        force (bool): Convert every PDF even if its text is up to date
+        log_path (str): CSV the conversions are appended to
+
+    Returns:
+        dict: Number of PDFs per status (converted, skipped, error, timeout)
+    """
+    if pymupdf is None:
+        raise ImportError("Converting PDFs needs PyMuPDF: pip install pymupdf")
+    counts = {'converted': 0, 'skipped': 0, 'error': 0, 'timeout': 0}
+    pending = []
+    for task in tasks:
+        if not force and up_to_date(*task):
+            counts['skipped'] += 1
+        else:
+            pending.append(task)
+    pending.reverse()
+    print(f"Converting {len(pending)} PDFs, {counts['skipped']} already up to date")
+
+    log_exists = log_path is not None and os.path.exists(log_path)
+    log_file = open(log_path, 'a', newline='', encoding='utf-8') if log_path is not None else None
+    writer = csv.writer(log_file) if log_file is not None else None
+    if writer is not None and not log_exists:
+        writer.writerow(['PDF', 'TXT', 'Status', 'Pages', 'Seconds', 'Error'])
+
+    def finish(task, status, pages, seconds, error):
+        counts[status] += 1
+        if status != 'converted':
+            print(f"Error processing file {task[0]}: {error}")
+        if writer is not None:
+            writer.writerow([task[0], task[1], status, pages if pages is not None else '', f"{seconds:.3f}", error or ''])
+            log_file.flush()
+
+    workers = [ConvertWorker() for _ in range(min(processes or cpu_count(), len(pending)))]
+    try:
+        while pending or any(worker.task is not None for worker in workers):
+            for worker in workers:
+                if worker.task is None and pending:
+                    worker.assign(pending.pop())
+            ready = wait([worker.conn for worker in workers if worker.task is not None], timeout=0.5)
+
+            for i, worker in enumerate(workers):
+                if worker.task is None:
+                    continue
+                if worker.conn in ready:
+                    try:
+                        status, pages, seconds, error = worker.conn.recv()
+                    except EOFError:
+                        # The worker exited mid-conversion, handled below as a crash.
+                        worker.process.join()
+                    else:
+                        finish(worker.task, status, pages, seconds, error)
+                        worker.task = None
+                        continue
+                elapsed = time.monotonic() - worker.started
+                if elapsed > timeout or not worker.process.is_alive():
+                    worker.kill()
+                    if elapsed > timeout:
+                        finish(worker.task, 'timeout', None, elapsed, f"killed after {timeout} seconds")
+                    else:
+                        finish(worker.task, 'error', None, elapsed, f"worker exited with code {worker.process.exitcode}")
+                    tmp_path = worker.task[1] + '.tmp'
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                    workers[i] = ConvertWorker()
+    finally:
+        for worker in workers:
+            worker.stop()
+        for worker in workers:
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.kill()
+            worker.conn.close()
+        if log_file is not None:
+            log_file.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert PDF papers to .txt files for search.py.')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--pdfs', type=str, help='Folder of PDFs; its layout is mirrored under --txt.')
+    source.add_argument('--store', type=str, help='pdf_store.py store; each distinct PDF is converted once.')
+    parser.add_argument('--txt', type=str, required=True, help='Folder for the text files.')
+    parser.add_argument('--processes', type=int, default=None, help='Conversions running at once, defaults to the number of cores.')
+    parser.add_argument('--timeout', type=float, default=TIMEOUT, help='Seconds one PDF may take before its worker is killed.')
+    parser.add_argument('--force', action='store_true', help='Convert every PDF even if its text is up to date.')
+    args = parser.parse_args()
+
+    tasks = store_tasks(args.store, args.txt) if args.store else pdf_tasks(args.pdfs, args.txt)
+    if not os.path.exists(args.txt):
+        os.makedirs(args.txt)
+    log_path = os.path.join(args.txt, LOG_NAME)
+    start = time.time()
+    counts = convert_pdfs(tasks, args.processes, args.timeout, args.force, log_path)
+    print(f"Converted {counts['converted']}, skipped {counts['skipped']}, failed {counts['error']}, "
+          f"timed out {counts['timeout']} in {time.time() - start:.1f}s; see {log_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+import os
+import json
+import zlib
+import struct
+import argparse
+from tqdm import tqdm
+
+# A pack is one file: the magic, zlib-compressed blocks of concatenated paper
+# bytes, the zlib-compressed JSON table of contents, then a footer holding the
+# table's offset and the magic again.
+PACK_MAGIC = b'PAPERPK1'
+PACK_VERSION = 1
+FOOTER = struct.Struct('<Q8s')
+BLOCK_SIZE = 1024 * 1024
+
+
+def is_pack(path):
+    return os.path.isfile(path) and path.endswith('.pack')
+
+
+def decode_text(data):
+    # Same decoding and newline translation as open(file_path, 'r', encoding='utf-8').
+    return data.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+
+
+def pack_directory(directory, pack_path, block_size=BLOCK_SIZE, level=6):
+    """
+    Pack every .txt file under directory into a single compressed file.
+
+    Papers are appended in directory walk order to blocks of about
+    block_size uncompressed bytes, so a sequential scan reads few large
+    blocks instead of opening one file per paper.
+
+    Args:
+        directory (str): Folder containing the converted .txt papers
+        pack_path (str): Path of the .pack file to write
+        block_size (int): Uncompressed bytes per block
+        level (int): zlib compression level
+
+    Returns:
+        int: Number of packed papers
+    """
+    file_paths = []
+    for root, dirs, files in os.walk(directory):
+        for file in files:
+            if file.endswith('.txt'):
+                file_paths.append(os.path.join(root, file))
+
+    folder = os.path.dirname(pack_path)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+    tmp_path = pack_path + '.tmp'
+
+    blocks = []
+    files = {}
+    pending = []
+    pending_size = 0
+    with open(tmp_path, 'wb') as f:
+        f.write(PACK_MAGIC)
+
+        def flush():
+            data = zlib.compress(b''.join(pending), level)
+            blocks.append([f.tell(), len(data)])
+            f.write(data)
+
+        for file_path in tqdm(file_paths, desc="Packing files"):
+            try:
+                with open(file_path, 'rb') as paper:
+                    data = paper.read()
+            except Exception as e:
+                print(f"Error processing file {file_path}: {e}")
+                continue
+            if pending and pending_size + len(data) > block_size:
+                flush()
+                pending = []
+                pending_size = 0
+            files[os.path.relpath(file_path, directory)] = [len(blocks), pending_size, len(data)]
+            pending.append(data)
+            pending_size += len(data)
+        if pending:
+            flush()
+
+        table_offset = f.tell()
+        table = {'version': PACK_VERSION, 'blocks': blocks, 'files': files}
+        f.write(zlib.compress(json.dumps(table).encode('utf-8')))
+        f.write(FOOTER.pack(table_offset, PACK_MAGIC))
+    os.replace(tmp_path, pack_path)
+    return len(files)
+
+
+class PackedCorpus:
+    """
+    Read-only access to a .pack file written by pack_directory.
+
+    names are the papers' paths relative to the packed directory. Single
+    papers are read with read(); iterating yields (name, text) for every paper
+    in pack order, decompressing each block once.
+    """
+
+    def __init__(self, pack_path):
+        self.pack_path = pack_path
+        self.file = open(pack_path, 'rb')
+        self.file.seek(-FOOTER.size, os.SEEK_END)
+        footer_end = self.file.tell()
+        table_offset, magic = FOOTER.unpack(self.file.read(FOOTER.size))
+        if magic != PACK_MAGIC:
+            self.file.close()
+            raise ValueError(f"{pack_path} is not a corpus pack")
+        self.file.seek(table_offset)
+        table = json.loads(zlib.decompress(self.file.read(footer_end - table_offset)))
+        if table.get('version') != PACK_VERSION:
+            self.file.close()
+            raise ValueError(f"Unsupported pack version in {pack_path}: {table.get('version')}")
+        self.blocks = table['blocks']
+        self.files = table['files']
+
+        # Papers of each block, in the order they were packed.
+        self.block_files = [[] for _ in self.blocks]
+        for name, (block, start, length) in self.files.items():
+            self.block_files[block].append((name, start, length))
+
+    def __len__(self):
+        return len(self.files)
+
+    def __contains__(self, name):
+        return name in self.files
+
+    @property
+    def names(self):
+        return list(self.files)
+
+    def read_block(self, block):
+        offset, length = self.blocks[block]
+        self.file.seek(offset)
+        return zlib.decompress(self.file.read(length))
+
+    def iter_block_bytes(self, block, chunk_size):
+        """
+        Yield the uncompressed bytes of a block in pieces of at most chunk_size bytes.
+
+        The block is read and decompressed piece by piece, so memory stays
+        bounded however large it is.
+        """
+        offset, length = self.blocks[block]
+        decompressor = zlib.decompressobj()
+        position = offset
+        end = offset + length
+        while position < end:
+            self.file.seek(position)
+            data = self.file.read(min(chunk_size, end - position))
+            if not data:
+                raise ValueError(f"{self.pack_path} is truncated in block {block}")
+            position += len(data)
+            while data:
+                chunk = decompressor.decompress(data, chunk_size)
+                data = decompressor.unconsumed_tail
+                if chunk:
+                    yield chunk
+        chunk = decompressor.flush()
+        if chunk:
+            yield chunk
+
+    def iter_block(self, block):
+        """Yield (name, text) for every paper of one block."""
+        data = self.read_block(block)
+        for name, start, length in self.block_files[block]:
+            yield name, decode_text(data[start:start + length])
+
+    def read(self, name):
+        block, start, length = self.files[name]
+        return decode_text(self.read_block(block)[start:start + length])
+
+    def __iter__(self):
+        for block in range(len(self.blocks)):
+            yield from self.iter_block(block)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def unpack(pack_path, directory):
+    """Write every paper of a pack back to its path under directory."""
+    with PackedCorpus(pack_path) as pack:
+        for block in range(len(pack.blocks)):
+            data = pack.read_block(block)
+            for name, start, length in pack.block_files[block]:
+                file_path = os.path.join(directory, name)
+                folder = os.path.dirname(file_path)
+                if folder and not os.path.exists(folder):
+                    os.makedirs(folder)
+                with open(file_path, 'wb') as f:
+                    f.write(data[start:start + length])
+        return len(pack)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pack the .txt corpus into a single compressed file, or unpack it.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    pack_parser = subparsers.add_parser('pack', help='Pack a folder of .txt papers.')
+    pack_parser.add_argument('--directory', type=str, required=True, help='Folder containing the .txt papers.')
+    pack_parser.add_argument('--output', type=str, required=True, help='Path of the .pack file to write.')
+    pack_parser.add_argument('--block-size', type=int, default=1, help='Uncompressed MiB per block.')
+
+    unpack_parser = subparsers.add_parser('unpack', help='Restore the .txt papers of a pack.')
+    unpack_parser.add_argument('--pack', type=str, required=True, help='Path of the .pack file.')
+    unpack_parser.add_argument('--directory', type=str, required=True, help='Folder to write the papers to.')
+
+    args = parser.parse_args()
+    if args.command == 'pack':
+        count = pack_directory(args.directory, args.output, args.block_size * 1024 * 1024)
+        print(f"Packed {count} files into {args.output}")
+    else:
+        count = unpack(args.pack, args.directory)
+        print(f"Unpacked {count} files into {args.directory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import os
+import argparse
+from collections import defaultdict, Counter
+import numpy as np
+import pandas as pd
+
+
+def results_to_matrix(results, queries=None):
+    """
+    Turn process_directory results into a files x queries count matrix.
+
+    Args:
+        results (dict): filename -> Counter of query counts
+        queries (list): Column order, defaults to the queries in order of
+            first appearance in results
+
+    Returns:
+        tuple: (int32 matrix, list of row filenames, list of column queries)
+    """
+    if queries is None:
+        queries = list(dict.fromkeys(query for file_counts in results.values() for query in file_counts))
+    else:
+        queries = list(queries)
+    columns = {query: j for j, query in enumerate(queries)}
+    files = list(results)
+
+    matrix = np.zeros((len(files), len(queries)), dtype=np.int32)
+    for i, file in enumerate(files):
+        for query, count in results[file].items():
+            if count:
+                matrix[i, columns[query]] = count
+    return matrix, files, queries
+
+
+def matrix_to_results(matrix, files, queries):
+    results = defaultdict(Counter)
+    for i, file in enumerate(files):
+        row = results[file]
+        for j in np.flatnonzero(matrix[i]):
+            row[queries[j]] = int(matrix[i, j])
+    return results
+
+
+def save_matrix(matrix_path, matrix, files, queries):
+    """
+    Save the count matrix with its row and column labels.
+
+    A .parquet path writes one row per file and one column per query (needs
+    pyarrow or fastparquet); anything else is written as a compressed .npz.
+    """
+    folder = os.path.dirname(matrix_path)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+    if matrix_path.endswith('.parquet'):
+        df = pd.DataFrame(matrix, index=pd.Index(files, name='File'), columns=list(queries))
+        df.to_parquet(matrix_path)
+    else:
+        np.savez_compressed(matrix_path, counts=matrix, files=np.array(files, dtype=str), queries=np.array(list(queries), dtype=str))
+
+
+def load_matrix(matrix_path):
+    """
+    Returns:
+        tuple: (int32 matrix, list of row filenames, list of column queries)
+    """
+    if matrix_path.endswith('.parquet'):
+        df = pd.read_parquet(matrix_path)
+        return df.to_numpy(dtype=np.int32), list(df.index), list(df.columns)
+    with np.load(matrix_path) as data:
+        return data['counts'], data['files'].tolist(), data['queries'].tolist()
+
+
+def files_at_threshold(matrix, threshold):
+    """Number of files per query with at least `threshold` occurrences."""
+    return np.count_nonzero(matrix >= threshold, axis=0)
+
+
+def save_matrix_statistics_to_csv(matrix, queries, output_path, high_freq_threshold=5, thresholds=()):
+    """
+    Write the same summary CSVs as save_query_statistics_to_csv from the matrix.
+
+    Args:
+        matrix (ndarray): files x queries count matrix
+        queries (list): Column labels of the matrix
+        output_path (str): Path of the basic statistics CSV; the high-frequency
+            table goes to the same path with a _high_freq suffix
+        high_freq_threshold (int): Minimum occurrences for the high-frequency table
+        thresholds (list): Extra thresholds, written as one column each to a
+            _thresholds CSV covering every query
+    """
+    files_at = {threshold: files_at_threshold(matrix, threshold) for threshold in {1, high_freq_threshold, *thresholds}}
+    save_file_counts_to_csv(queries, files_at, output_path, high_freq_threshold, thresholds)
+
+
+def save_file_counts_to_csv(queries, files_at, output_path, high_freq_threshold=5, thresholds=()):
+    """
+    Write the summary CSVs from per-query file counts.
+
+    Args:
+        queries (list): Query labels
+        files_at (dict): Threshold -> number of files per query with at least
+            that many occurrences; needs 1, high_freq_threshold and thresholds
+        output_path, high_freq_threshold, thresholds: As save_matrix_statistics_to_csv
+    """
+    queries = np.array(list(queries), dtype=object)
+
+    containing = files_at[1]
+    keep = containing > 0
+    df_query = pd.DataFrame({'Query': queries[keep], 'Files Containing Keyword': containing[keep]})
+
+    high_freq = files_at[high_freq_threshold]
+    keep = high_freq > 0
+    df_high_freq = pd.DataFrame({'Query': queries[keep], f'Files with >={high_freq_threshold} Occurrences': high_freq[keep]})
+
+    df_query.to_csv(output_path, index=False)
+    df_high_freq.to_csv(output_path.replace('.csv', '_high_freq.csv'), index=False)
+
+    if thresholds:
+        df_thresholds = pd.DataFrame({'Query': queries})
+        for threshold in thresholds:
+            df_thresholds[f'Files with >={threshold} Occurrences'] = files_at[threshold]
+        df_thresholds.to_csv(output_path.replace('.csv', '_thresholds.csv'), index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarise a saved files x queries count matrix.')
+    parser.add_argument('--matrix', type=str, required=True, help='The .npz or .parquet count matrix.')
+    parser.add_argument('--output', type=str, required=True, help='Path of the statistics CSV.')
+    parser.add_argument('--high-freq-threshold', type=int, default=5, help='Minimum occurrences for the high-frequency table.')
+    parser.add_argument('--thresholds', type=int, nargs='*', default=[], help='Extra thresholds for the _thresholds CSV.')
+    args = parser.parse_args()
+
+    matrix, files, queries = load_matrix(args.matrix)
+    save_matrix_statistics_to_csv(matrix, queries, args.output, args.high_freq_threshold, args.thresholds)
+    print(f"Summarised {len(files)} files x {len(queries)} queries into {args.output}")
+
+
+if __name__ == "__main__":
+    main()
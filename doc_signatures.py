@@ -0,0 +1,301 @@
+import os
+import argparse
+from multiprocessing import Pool, cpu_count
+from contextlib import closing
+from tqdm import tqdm
+
+import numpy as np
+
+from corpus_pack import PackedCorpus, decode_text, is_pack
+from query_compiler import And, Near, Not, Or, Sentence, Term, split_term
+from query_grid import CompiledGrid
+
+# Each paper gets a Bloom filter over the character trigrams of its casefolded
+# text, with about BITS_PER_GRAM bits per distinct trigram and HASH_MULTIPLIERS
+# hashes per trigram. A term can only occur in a paper whose filter holds all
+# of the term's trigrams, whatever the case mode of the term.
+GRAM = 3
+BITS_PER_GRAM = 8
+MIN_LOG2_BITS = 9
+MAX_LOG2_BITS = 24
+HASH_MULTIPLIERS = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9], dtype=np.uint64)
+
+
+def text_grams(text):
+    """Distinct trigrams of the casefolded text, each packed into a uint64."""
+    codes = np.frombuffer(text.casefold().encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    if codes.size < GRAM:
+        return np.zeros(0, dtype=np.uint64)
+    keys = (codes[:-2] << np.uint64(42)) | (codes[1:-1] << np.uint64(21)) | codes[2:]
+    return np.unique(keys)
+
+
+def term_grams(text):
+    """
+    Trigrams a paper must contain for the term to occur in it.
+
+    Returns None when the filter cannot rule the term out: terms shorter
+    than a trigram, and non-ASCII terms, whose lowercasing may not agree
+    with the casefolded text.
+    """
+    if len(text) < GRAM or not text.isascii():
+        return None
+    return text_grams(text)
+
+
+def mix(keys):
+    return keys ^ (keys >> np.uint64(29))
+
+
+def signature(text):
+    """
+    Returns:
+        tuple: (log2 of the filter size in bits, filter bytes)
+    """
+    keys = mix(text_grams(text))
+    log2_bits = min(max(int(np.ceil(np.log2(max(keys.size * BITS_PER_GRAM, 1)))), MIN_LOG2_BITS), MAX_LOG2_BITS)
+    bits = np.zeros(1 << log2_bits, dtype=bool)
+    shift = np.uint64(64 - log2_bits)
+    for multiplier in HASH_MULTIPLIERS:
+        bits[(keys * multiplier) >> shift] = True
+    return log2_bits, np.packbits(bits, bitorder='little').tobytes()
+
+
+def signature_file(task):
+    file_path, name, size, mtime_ns = task
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+    except Exception as e:
+        print(f"Error processing file {file_path}: {e}")
+        return []
+    return [(name, size, mtime_ns) + signature(content)]
+
+
+def signature_block(task):
+    pack_path, block, mtime_ns = task
+    entries = []
+    with PackedCorpus(pack_path) as pack:
+        data = pack.read_block(block)
+        for name, start, length in pack.block_files[block]:
+            try:
+                content = decode_text(data[start:start + length])
+            except Exception as e:
+                print(f"Error processing file {name}: {e}")
+                continue
+            entries.append((name, length, mtime_ns) + signature(content))
+    return entries
+
+
+def maybe_nonzero(node, term_masks, memo):
+    """
+    Papers for which node may evaluate to nonzero, as a boolean array.
+
+    AND needs every part, OR any part and "A NOT B", NEAR and SENTENCE at
+    least their left term (and right term for NEAR and SENTENCE).
+    """
+    if id(node) in memo:
+        return memo[id(node)]
+    if isinstance(node, Term):
+        mask = term_masks[node.index]
+    elif isinstance(node, (Near, Sentence)):
+        mask = term_masks[node.left.index] & term_masks[node.right.index]
+    elif isinstance(node, Not):
+        mask = maybe_nonzero(node.left, term_masks, memo)
+    elif isinstance(node, And):
+        mask = np.logical_and.reduce([maybe_nonzero(child, term_masks, memo) for child in node.children])
+    elif isinstance(node, Or):
+        mask = np.logical_or.reduce([maybe_nonzero(child, term_masks, memo) for child in node.children])
+    else:
+        # A node this rule does not know could skip papers that match.
+        raise ValueError(f"No signature rule for query node {type(node).__name__}")
+    memo[id(node)] = mask
+    return mask
+
+
+class SignatureStore:
+    """
+    Trigram Bloom filters of a corpus, one per paper, stored as a single .npz.
+
+    names are the papers' paths relative to the corpus folder (or their
+    names in a pack); size and mtime_ns record the file each filter was
+    built from, so stale filters are never used to skip a paper.
+    """
+
+    def __init__(self, entries=()):
+        entries = sorted(entries)
+        self.names = [entry[0] for entry in entries]
+        self.sizes = np.array([entry[1] for entry in entries], dtype=np.int64)
+        self.mtimes = np.array([entry[2] for entry in entries], dtype=np.int64)
+        self.log2_bits = np.array([entry[3] for entry in entries], dtype=np.uint64)
+        lengths = np.array([len(entry[4]) for entry in entries], dtype=np.int64)
+        self.offsets = np.concatenate(([0], np.cumsum(lengths)[:-1])).astype(np.int64) if entries else lengths
+        self.bits = np.frombuffer(b''.join(entry[4] for entry in entries), dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.names)
+
+    def entries(self):
+        for i, name in enumerate(self.names):
+            start = self.offsets[i]
+            length = (1 << int(self.log2_bits[i])) // 8
+            yield name, int(self.sizes[i]), int(self.mtimes[i]), int(self.log2_bits[i]), self.bits[start:start + length].tobytes()
+
+    def may_contain(self, text):
+        """Papers whose filter holds every trigram of text, as a boolean array."""
+        mask = np.ones(len(self.names), dtype=bool)
+        keys = term_grams(text)
+        if keys is None or not mask.size:
+            return mask
+        shift = np.uint64(64) - self.log2_bits
+        for multiplier in HASH_MULTIPLIERS:
+            for hashed in mix(keys) * multiplier:
+                positions = hashed >> shift
+                byte = self.bits[self.offsets + (positions >> np.uint64(3)).astype(np.int64)]
+                mask &= ((byte >> (positions & np.uint64(7)).astype(np.uint8)) & 1).astype(bool)
+        return mask
+
+    def rejected(self, compiled, corpus):
+        """
+        Papers of corpus that no query can match according to their filters.
+
+        Only filters built from the current version of a paper are used.
+
+        Args:
+            compiled (CompiledQueries or CompiledGrid): Queries being searched
+            corpus (str): Folder of .txt papers or .pack file
+
+        Returns:
+            set: File paths for a folder, pack names for a pack
+        """
+        if not self.names:
+            return set()
+        term_masks = [self.may_contain(split_term(term, compiled.ignore_case)[0]) for term in compiled.terms]
+        memo = {}
+        if isinstance(compiled, CompiledGrid) and compiled.nodes:
+            candidates = np.logical_and.reduce([np.logical_or.reduce([maybe_nonzero(node, term_masks, memo) for node in nodes])
+                                                for nodes in compiled.nodes])
+        elif compiled.nodes:
+            candidates = np.logical_or.reduce([maybe_nonzero(node, term_masks, memo) for node in compiled.nodes])
+        else:
+            candidates = np.ones(len(self.names), dtype=bool)
+
+        rejected = set()
+        if is_pack(corpus):
+            mtime_ns = os.stat(corpus).st_mtime_ns
+            with PackedCorpus(corpus) as pack:
+                for i in np.flatnonzero(~candidates):
+                    name = self.names[i]
+                    if name in pack.files and pack.files[name][2] == self.sizes[i] and self.mtimes[i] == mtime_ns:
+                        rejected.add(name)
+        else:
+            for i in np.flatnonzero(~candidates):
+                file_path = os.path.join(corpus, self.names[i])
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    continue
+                if stat.st_size == self.sizes[i] and stat.st_mtime_ns == self.mtimes[i]:
+                    rejected.add(file_path)
+        return rejected
+
+
+def save_signatures(store, signatures_path):
+    folder = os.path.dirname(signatures_path)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+    tmp_path = signatures_path + '.tmp.npz'
+    np.savez(tmp_path, names=np.array(store.names, dtype=str), sizes=store.sizes, mtimes=store.mtimes,
+             log2_bits=store.log2_bits, offsets=store.offsets, bits=store.bits)
+    os.replace(tmp_path, signatures_path)
+
+
+def load_signatures(signatures_path):
+    store = SignatureStore()
+    with np.load(signatures_path) as data:
+        store.names = data['names'].tolist()
+        store.sizes = data['sizes']
+        store.mtimes = data['mtimes']
+        store.log2_bits = data['log2_bits']
+        store.offsets = data['offsets']
+        store.bits = data['bits']
+    return store
+
+
+def signature_path(corpus):
+    """Default location of a corpus' signatures: next to the folder or pack."""
+    return os.path.normpath(corpus) + '.sig.npz'
+
+
+def build_signatures(corpus, existing=None, processes=None, chunksize=None):
+    """
+    Build the trigram filters of every paper of a folder or .pack file.
+
+    Args:
+        corpus (str): Folder containing the .txt papers, or a .pack file
+        existing (SignatureStore): Filters to reuse for papers whose size
+            and mtime are unchanged
+        processes (int): Worker processes, defaults to cpu_count()
+
+    Returns:
+        SignatureStore
+    """
+    reuse = {}
+    if existing is not None:
+        reuse = {entry[0]: entry for entry in existing.entries()}
+
+    entries = []
+    if is_pack(corpus):
+        mtime_ns = os.stat(corpus).st_mtime_ns
+        with PackedCorpus(corpus) as pack:
+            tasks = []
+            for block, files in enumerate(pack.block_files):
+                kept = [reuse[name] for name, _, length in files
+                        if name in reuse and reuse[name][1] == length and reuse[name][2] == mtime_ns]
+                if len(kept) == len(files):
+                    entries.extend(kept)
+                else:
+                    tasks.append((corpus, block, mtime_ns))
+        worker = signature_block
+    else:
+        tasks = []
+        for root, dirs, files in os.walk(corpus):
+            for file in files:
+                if file.endswith('.txt'):
+                    file_path = os.path.join(root, file)
+                    name = os.path.relpath(file_path, corpus)
+                    stat = os.stat(file_path)
+                    entry = reuse.get(name)
+                    if entry is not None and entry[1] == stat.st_size and entry[2] == stat.st_mtime_ns:
+                        entries.append(entry)
+                    else:
+                        tasks.append((file_path, name, stat.st_size, stat.st_mtime_ns))
+        worker = signature_file
+
+    reused = len(entries)
+    if tasks:
+        processes = processes or cpu_count()
+        chunksize = chunksize or max(len(tasks) // (processes * 4), 1)
+        with closing(Pool(processes)) as pool:
+            for results in tqdm(pool.imap_unordered(worker, tasks, chunksize), total=len(tasks), desc="Signing files"):
+                entries.extend(results)
+    print(f"Signed {len(entries) - reused} files, reused {reused} unchanged signatures")
+    return SignatureStore(entries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build per-paper trigram Bloom filters that let searches skip papers.')
+    parser.add_argument('--corpus', type=str, required=True, help='Folder containing the .txt papers, or a .pack file.')
+    parser.add_argument('--output', type=str, default=None, help='Path of the signatures .npz, next to the corpus by default.')
+    parser.add_argument('--processes', type=int, default=None, help='Worker processes, defaults to the number of cores.')
+    args = parser.parse_args()
+
+    output = args.output or signature_path(args.corpus)
+    existing = load_signatures(output) if os.path.exists(output) else None
+    store = build_signatures(args.corpus, existing, args.processes)
+    save_signatures(store, output)
+    print(f"Saved signatures of {len(store)} files to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+import os
+import re
+import json
+import threading
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+WORKERS = 8
+PER_HOST = 4
+TIMEOUT = 60
+CHUNK_SIZE = 64 * 1024
+# Smallest size a real paper PDF is expected to have.
+MIN_PDF_BYTES = 1024
+
+CONTENT_RANGE_PATTERN = re.compile(r'bytes (\d+)-(\d+)/(\d+)')
+
+
+class HostLimiter:
+    """At most per_host requests in flight to any one host."""
+
+    def __init__(self, per_host=PER_HOST):
+        self.per_host = per_host
+        self.semaphores = {}
+        self.lock = threading.Lock()
+
+    def semaphore(self, url):
+        host = urlsplit(url).netloc.lower()
+        with self.lock:
+            if host not in self.semaphores:
+                self.semaphores[host] = threading.BoundedSemaphore(self.per_host)
+            return self.semaphores[host]
+
+
+def check_pdf(path, expected_size=None, min_size=MIN_PDF_BYTES):
+    """
+    Cheap test that path holds a whole PDF: its size, the %PDF- header and a %%EOF marker near the end.
+
+    Raises:
+        ValueError: Naming the failed check
+    """
+    size = os.path.getsize(path)
+    if expected_size is not None and size != expected_size:
+        raise ValueError(f"{path} has {size} of {expected_size} bytes")
+    if size < min_size:
+        raise ValueError(f"{path} has only {size} bytes")
+    with open(path, 'rb') as f:
+        head = f.read(1024)
+        f.seek(max(size - 1024, 0))
+        tail = f.read()
+    if b'%PDF-' not in head:
+        raise ValueError(f"{path} does not start with %PDF-")
+    if b'%%EOF' not in tail:
+        raise ValueError(f"{path} has no %%EOF marker, it is truncated")
+
+
+def expected_size(response, offset):
+    """Full size of the file from Content-Range or Content-Length, or None if the server gave neither."""
+    if response.headers.get('content-encoding'):
+        # Content-Length counts the compressed bytes.
+        return None
+    if response.status_code == 206:
+        match = CONTENT_RANGE_PATTERN.match(response.headers.get('content-range', ''))
+        return int(match.group(3)) if match else None
+    length = response.headers.get('content-length')
+    return offset + int(length) if length is not None else None
+
+
+def source_url(response):
+    """URL first requested for a response, before any redirect."""
+    return response.history[0].url if response.history else response.url
+
+
+def resume_validator(response):
+    """
+    Strong ETag or Last-Modified of a response, which an If-Range header can
+    send back to resume it only while the file is unchanged, or None.
+    """
+    etag = response.headers.get('etag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return response.headers.get('last-modified')
+
+
+def read_part_info(path):
+    """URL and validator saved next to the part of path, or None if missing or unreadable."""
+    try:
+        with open(path + '.part.json', 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_part_info(path, response):
+    with open(path + '.part.json', 'w', encoding='utf-8') as f:
+        json.dump({'url': source_url(response), 'validator': resume_validator(response)}, f)
+
+
+def remove_part(path):
+    for part_path in (path + '.part', path + '.part.json'):
+        if os.path.exists(part_path):
+            os.remove(part_path)
+
+
+def make_session(pool_size, headers=None):
+    """
+    requests.Session keeping up to pool_size open connections per host.
+
+    Every thread shares it, so papers fetched from one mirror reuse the
+    same TCP and TLS connections instead of opening one per request.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    if headers:
+        session.headers.update(headers)
+    return session
+
+
+class DownloadEngine:
+    """
+    Thread pool fetching URLs through one pooled session.
+
+    workers caps the requests in flight overall and per_host the requests
+    in flight to each host. Call get() from the function given to map().
+    """
+
+    def __init__(self, workers=WORKERS, per_host=PER_HOST, timeout=TIMEOUT, headers=None):
+        self.workers = workers
+        self.timeout = timeout
+        self.session = make_session(workers, headers)
+        self.hosts = HostLimiter(min(per_host, workers))
+
+    def get(self, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        with self.hosts.semaphore(url):
+            return self.session.get(url, **kwargs)
+
+    @contextmanager
+    def stream(self, url, **kwargs):
+        """get() with stream=True, holding the host's slot until the body has been read."""
+        kwargs.setdefault('timeout', self.timeout)
+        with self.hosts.semaphore(url):
+            with self.session.get(url, stream=True, **kwargs) as response:
+                yield response
+
+    def resume_headers(self, url, path):
+        """
+        Range and If-Range headers asking url for the rest of the part of path, or None.
+
+        Only a part saved from url with an ETag or Last-Modified is resumed,
+        so the server sends the whole file instead if it has changed since.
+        """
+        if not os.path.exists(path + '.part'):
+            return None
+        info = read_part_info(path)
+        if info is None or info.get('url') != url or not info.get('validator'):
+            return None
+        return {'Range': f"bytes={os.path.getsize(path + '.part')}-", 'If-Range': info['validator']}
+
+    @contextmanager
+    def resume_stream(self, url, path):
+        """stream() with resume_headers(), asking again for the whole file if the server refuses the range."""
+        headers = self.resume_headers(url, path)
+        with self.stream(url, headers=headers) as r:
+            if headers is None or r.status_code != 416:
+                yield r
+                return
+        # The part does not fit the file on the server: start over.
+        remove_part(path)
+        with self.stream(url) as r:
+            yield r
+
+    def save(self, response, path, min_size=MIN_PDF_BYTES):
+        """
+        Stream a PDF response to path in CHUNK_SIZE pieces.
+
+        The body goes to path + '.part', appended to it for a 206 answer to
+        resume_headers() and written from the start for any other answer,
+        and is moved to path only once it passes check_pdf. The URL and
+        validator of the response are kept in path + '.part.json', so a part
+        cut short by a lost connection can be resumed; a whole part that is
+        not a PDF is removed.
+
+        Raises:
+            ValueError: If the PDF fails check_pdf or a 206 answer does not continue the part
+
+        Returns:
+            int: Size of the saved PDF
+        """
+        part_path = path + '.part'
+        offset = 0
+        if response.status_code == 206 and os.path.exists(part_path):
+            offset = os.path.getsize(part_path)
+            match = CONTENT_RANGE_PATTERN.match(response.headers.get('content-range', ''))
+            if match is None or int(match.group(1)) != offset:
+                remove_part(path)
+                raise ValueError(f"{source_url(response)} did not continue the part from byte {offset}")
+        else:
+            write_part_info(path, response)
+        size = expected_size(response, offset)
+        with open(part_path, 'ab' if offset else 'wb') as f:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                f.write(chunk)
+        try:
+            check_pdf(part_path, size, min_size)
+        except ValueError:
+            if size is None or os.path.getsize(part_path) >= size:
+                remove_part(path)
+            raise
+        os.replace(part_path, path)
+        os.remove(path + '.part.json')
+        return os.path.getsize(path)
+
+    def download(self, url, path, min_size=MIN_PDF_BYTES):
+        """
+        Download the PDF at url to path, resuming a part left by an earlier download of url.
+
+        Raises:
+            ValueError: If url does not answer with a whole PDF
+
+        Returns:
+            int: Size of the saved PDF
+        """
+        with self.resume_stream(url, path) as r:
+            r.raise_for_status()
+            if 'application/pdf' not in (r.headers.get('content-type') or ''):
+                raise ValueError(f"{url} is not a PDF")
+            return self.save(r, path, min_size)
+
+    def map(self, fetch, items):
+        """
+        Run fetch(self, item) for every item on the thread pool.
+
+        Returns:
+            iterator: (item, result of fetch) in the order of items
+        """
+        # Only about two fetches per worker are queued ahead, and the rest are
+        # cancelled when the caller stops early (an exception or Ctrl-C), so
+        # the run ends with the fetches in flight instead of the whole list.
+        window = deque()
+        executor = ThreadPoolExecutor(self.workers)
+        try:
+            for item in items:
+                window.append((item, executor.submit(fetch, self, item)))
+                if len(window) >= self.workers * 2:
+                    item, future = window.popleft()
+                    yield item, future.result()
+            while window:
+                item, future = window.popleft()
+                yield item, future.result()
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
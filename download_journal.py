@@ -0,0 +1,90 @@
+import os
+import csv
+import json
+import time
+
+from append_file import truncate_partial_line
+
+JOURNAL_NAME = 'journal.jsonl'
+
+
+class DownloadJournal:
+    """
+    Append-only record of every download attempt, one JSON line per attempt.
+
+    The last line of a DOI gives its status ('True', 'False' or 'Error');
+    earlier lines only add to its attempt count. Appending never rewrites
+    the file, and a line cut short by an interrupted run is dropped when
+    the journal is opened again. A progress.json list of downloaded DOIs
+    found next to a new journal is carried over as successful attempts.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        folder = os.path.dirname(path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        exists = os.path.exists(path)
+        if exists:
+            self.load()
+        self.f = open(path, 'a', encoding='utf-8')
+        if not exists:
+            self.migrate(os.path.join(folder, 'progress.json'))
+
+    def load(self):
+        truncate_partial_line(self.path)
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                self.add(json.loads(line))
+
+    def migrate(self, progress_file):
+        if not os.path.exists(progress_file):
+            return
+        with open(progress_file, 'r') as file:
+            dois = json.load(file)
+        for doi in dois:
+            self.record(doi, 'True')
+        print(f"Migrated {len(dois)} DOIs from {progress_file}")
+
+    def add(self, record):
+        entry = self.entries.get(record['doi'])
+        attempts = entry['attempts'] + 1 if entry is not None else 1
+        self.entries[record['doi']] = dict(record, attempts=attempts)
+
+    def record(self, doi, status, size=0, seconds=0.0, error=None):
+        """Append one attempt and flush it to disk."""
+        record = {'doi': doi, 'status': status, 'bytes': size, 'seconds': round(seconds, 3), 'error': error,
+                  'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+        self.f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.f.flush()
+        self.add(record)
+
+    def status(self, doi):
+        entry = self.entries.get(doi)
+        return None if entry is None else entry['status']
+
+    def downloaded(self):
+        return {doi for doi, entry in self.entries.items() if entry['status'] == 'True'}
+
+    def failed(self):
+        return {doi for doi, entry in self.entries.items() if entry['status'] != 'True'}
+
+    def write_report(self, csv_file, doi_l):
+        """Write the status CSV of doi_l from the journal; DOIs never attempted get an empty status."""
+        with open(csv_file, mode='w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['DOI', 'Modified DOI', 'Status', 'Attempts', 'Bytes', 'Seconds', 'Error'])
+            for doi in doi_l:
+                entry = self.entries.get(doi, {})
+                writer.writerow([doi, doi.replace('/', '_'), entry.get('status', ''), entry.get('attempts', 0),
+                                 entry.get('bytes', ''), entry.get('seconds', ''), entry.get('error') or ''])
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,124 @@
+import re
+from html.parser import HTMLParser
+
+from bs4 import BeautifulSoup
+from bs4.builder import HTMLTreeBuilder
+
+PDF_ID_PATTERN = re.compile(r'''\bid\s*=\s*["']?(?:pdf|plugin)(?=["'\s/>])''', re.IGNORECASE)
+LIST_PATTERN = re.compile(r'<ul\b', re.IGNORECASE)
+# Tags BeautifulSoup closes as soon as they open, like <br> and <img>.
+VOID_ELEMENTS = frozenset(HTMLTreeBuilder.DEFAULT_EMPTY_ELEMENT_TAGS)
+
+
+class ScanError(Exception):
+    """The page is shaped in a way the scanners do not handle; parse it with BeautifulSoup."""
+
+
+class StopScan(Exception):
+    pass
+
+
+class PdfSourceScanner(HTMLParser):
+    """Collects the src of the first tags with id="pdf" and id="plugin", stopping once the first has one."""
+
+    def __init__(self):
+        super().__init__()
+        self.sources = {}
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        element_id = attrs.get('id')
+        if element_id in ('pdf', 'plugin') and element_id not in self.sources:
+            src = attrs.get('src')
+            # BeautifulSoup reads an attribute without a value as ''.
+            self.sources[element_id] = '' if src is None and 'src' in attrs else src
+            if self.sources.get('pdf') is not None or len(self.sources) == 2:
+                raise StopScan
+
+
+class ListLinkScanner(HTMLParser):
+    """
+    Collects the href of every <a> inside a <ul>, like ul.findAll("a") over soup.findAll("ul").
+
+    Open tags are kept the way BeautifulSoup's html.parser tree builder
+    keeps them: void elements never stay open, an end tag closes every tag
+    opened since the latest start tag of its name (so a </div> also closes
+    a <ul> left open inside the div), and an end tag with nothing to close
+    is ignored.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.open_tags = []
+        self.lists = 0
+        self.links = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'ul' and self.lists:
+            # Nested lists repeat their links once per enclosing list,
+            # in an order only the tree gives.
+            raise ScanError
+        if tag == 'a' and self.lists:
+            attrs = dict(attrs)
+            href = attrs.get('href')
+            self.links.append('' if href is None and 'href' in attrs else href)
+        if tag not in VOID_ELEMENTS:
+            self.open_tags.append(tag)
+            self.lists += tag == 'ul'
+
+    def handle_endtag(self, tag):
+        for i in range(len(self.open_tags) - 1, -1, -1):
+            if self.open_tags[i] == tag:
+                self.lists -= self.open_tags[i:].count('ul')
+                del self.open_tags[i:]
+                return
+
+
+def soup_pdf_sources(html):
+    """src of the tags with id="pdf" and id="plugin" from a full parse, None where missing."""
+    soup = BeautifulSoup(html, "html.parser")
+    iframe = soup.find(id='pdf')
+    plugin = soup.find(id='plugin')
+    return (iframe.get("src") if iframe is not None else None,
+            plugin.get("src") if plugin is not None else None)
+
+
+def find_pdf_sources(html):
+    """
+    soup_pdf_sources without building the tree.
+
+    Pages without an id="pdf" or id="plugin" attribute are answered by a
+    regular expression; the others are tokenized by html.parser (which
+    BeautifulSoup also uses) up to the tags, so the result is the same.
+    The full parse is the fallback if the tokenizer fails.
+    """
+    if not PDF_ID_PATTERN.search(html):
+        return None, None
+    scanner = PdfSourceScanner()
+    try:
+        scanner.feed(html)
+        scanner.close()
+    except StopScan:
+        pass
+    except Exception:
+        return soup_pdf_sources(html)
+    return scanner.sources.get('pdf'), scanner.sources.get('plugin')
+
+
+def soup_list_links(html):
+    """href of every <a> in each <ul>, from a full parse."""
+    soup = BeautifulSoup(html, "html.parser")
+    return [a.get("href") for ul in soup.findAll("ul") for a in ul.findAll("a")]
+
+
+def find_list_links(html):
+    """soup_list_links without building the tree, falling back to the full parse for nested lists."""
+    if not LIST_PATTERN.search(html):
+        return []
+    scanner = ListLinkScanner()
+    try:
+        scanner.feed(html)
+        scanner.close()
+    except Exception:
+        return soup_list_links(html)
+    return scanner.links
@@ -1,12 +1,22 @@
-import csv
 import os
 import argparse
-import requests
 import json
+import time
+import requests
+from collections import namedtuple
 from urllib.parse import urljoin
 
 from bs4 import BeautifulSoup
 
+from download_engine import PER_HOST, TIMEOUT, WORKERS, DownloadEngine
+from download_journal import JOURNAL_NAME, DownloadJournal
+from html_extract import find_list_links, find_pdf_sources, soup_list_links, soup_pdf_sources
+from pdf_store import PdfStore
+from resolver_pool import RETRIES, ResolverPool
+
+# Outcome of one DOI: status is 'True', 'False' or 'Error' as in the status CSV.
+PaperResult = namedtuple('PaperResult', ['status', 'bytes', 'seconds', 'error'])
+
 
 def schoolarParser(html):
     result = []
@@ -69,18 +79,12 @@ def isBook(tag):
     return result
 
 
-def getSchiHubPDF(html):
-    result = None
-    soup = BeautifulSoup(html, "html.parser")
-
-    iframe = soup.find(id='pdf')
-    plugin = soup.find(id='plugin')
-
-    if iframe is not None:
-        result = iframe.get("src")
+def getSchiHubPDF(html, fast=True):
+    iframe_src, plugin_src = find_pdf_sources(html) if fast else soup_pdf_sources(html)
+    result = iframe_src
 
-    if plugin is not None and result is None:
-        result = plugin.get("src")
+    if result is None:
+        result = plugin_src
 
     if result is not None and result[0] != "h":
         result = "HTTPS:" + result
@@ -88,116 +92,173 @@ def getSchiHubPDF(html):
     return result
 
 
-def SciHubUrls(html):
+def SciHubUrls(html, fast=True):
     result = []
-    soup = BeautifulSoup(html, "html.parser")
 
-    for ul in soup.findAll("ul"):
-        for a in ul.findAll("a"):
-            link = a.get("href")
-            if link.startswith("HTTPS://sci-hub.") or link.startswith("HTTP://sci-hub."):
-                result.append(link)
+    for link in find_list_links(html) if fast else soup_list_links(html):
+        if link.startswith("HTTPS://sci-hub.") or link.startswith("HTTP://sci-hub."):
+            result.append(link)
 
     return result
 
 class NetInfo:
     SciHub_URL = None
+    SciHub_URLs = None
     HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/74.0.3729.169 Safari/537.36'}
     SciHub_URLs_repo = "HTTPS://sci-hub.41610.org/"
 
 
-parser = argparse.ArgumentParser(description='Download papers from Sci-Hub.')
-parser.add_argument('--txt', type=str, required=True, help='The txt file containing the DOIs.')
-args = parser.parse_args()
-
 def setSciHubUrl():
-    r = requests.get(NetInfo.SciHub_URLs_repo, headers=NetInfo.HEADERS)
-    links = SciHubUrls(r.text)
-    NetInfo.SciHub_URL = "HTTPS://sci-hub.hkvisa.net"  
-    print("\nUsing {} as Sci-Hub instance".format(NetInfo.SciHub_URL))
-
-def saveFile(folder, file_name, content):
-    if not os.path.exists(folder):
-        os.makedirs(folder)
-    with open(os.path.join(folder, file_name), 'wb') as f:
-        f.write(content)
-
-def getDownloadedDois(dwnl_dir):
-    progress_file = os.path.join(dwnl_dir, 'progress.json')
-    if os.path.exists(progress_file):
-        with open(progress_file, 'r') as file:
-            return json.load(file)
-    return []
-
-def saveDownloadedDoi(dwnl_dir, doi):
-    progress_file = os.path.join(dwnl_dir, 'progress.json')
-    downloaded_dois = getDownloadedDois(dwnl_dir)
-    downloaded_dois.append(doi)
-    with open(progress_file, 'w') as file:
-        json.dump(downloaded_dois, file)
-
-def downloadPapers(doi_l, dwnl_dir):
+    NetInfo.SciHub_URL = "HTTPS://sci-hub.hkvisa.net"
+    NetInfo.SciHub_URLs = [NetInfo.SciHub_URL]
+    try:
+        r = requests.get(NetInfo.SciHub_URLs_repo, headers=NetInfo.HEADERS, timeout=TIMEOUT)
+        NetInfo.SciHub_URLs += SciHubUrls(r.text)
+    except requests.RequestException as e:
+        print(f"Could not read the mirror list: {e}")
+    print("\nUsing {} as Sci-Hub instances".format(', '.join(NetInfo.SciHub_URLs)))
+
+def fetchPaper(engine, pool, doi, dwnl_dir):
+    """
+    Download the PDF of one DOI through a mirror of the pool, on one of the engine's threads.
+
+    PDFs are streamed to a .part file and only renamed to <doi>.pdf once
+    they pass download_engine.check_pdf. A part is resumed when the next
+    attempt asks the same URL, whether a mirror or the PDF link of its page.
+
+    Returns:
+        PaperResult: 'True' if the PDF was saved, 'False' if the mirror had none
+            or sent an invalid file, 'Error' if a request failed, with the PDF
+            size and the time taken
+    """
     def URLjoin(*args):
         return "/".join(map(lambda x: str(x).rstrip('/'), args))
 
-    setSciHubUrl()
+    def fetchPage(mirror):
+        with engine.resume_stream(URLjoin(mirror, doi), pdf_path) as r:
+            if r.status_code >= 500:
+                r.raise_for_status()
+            if 'application/pdf' in (r.headers.get('content-type') or ''):
+                return mirror, engine.save(r, pdf_path), None
+            return mirror, None, r.text
+
+    pdf_path = os.path.join(dwnl_dir, doi.replace('/', '_') + '.pdf')
+    start = time.perf_counter()
+    try:
+        mirror, size, html = pool.call(fetchPage)
+        if size is not None:
+            print(f"Successfully downloaded {doi}")
+            return PaperResult('True', size, time.perf_counter() - start, None)
+
+        pdf_url = getSchiHubPDF(html)
+        if pdf_url is None:
+            print(f"Failed to download {doi}")
+            return PaperResult('False', 0, time.perf_counter() - start, 'no PDF link on the mirror page')
+        print(f"Extracted PDF URL: {pdf_url}")
+
+        if not pdf_url.startswith('HTTP'):
+            pdf_url = urljoin(mirror, pdf_url)
+
+        size = engine.download(pdf_url, pdf_path)
+        print(f"Successfully downloaded {doi}")
+        return PaperResult('True', size, time.perf_counter() - start, None)
+    except ValueError as e:
+        print(f"Failed to download {doi}: {e}")
+        return PaperResult('False', 0, time.perf_counter() - start, str(e))
+    except Exception as e:
+        print(f"Error occurred: {e}")
+        return PaperResult('Error', 0, time.perf_counter() - start, str(e))
+
+
+def downloadPapers(doi_l, dwnl_dir, csv_file=None, workers=WORKERS, per_host=PER_HOST, timeout=TIMEOUT,
+                   retry_failed=False, mirrors=None, retries=RETRIES, store_dir=None):
+    """
+    Download the PDF of every DOI into dwnl_dir, workers at a time.
+
+    Every attempt is appended to <dwnl_dir>/journal.jsonl, and DOIs it
+    records as downloaded are skipped, so an interrupted run resumes where
+    it stopped. The status CSV is written from the journal at the end.
+
+    Args:
+        doi_l (list): DOIs to download
+        dwnl_dir (str): Folder of the PDFs and of the journal
+        csv_file (str): Status CSV, by default <dwnl_dir>/<dwnl_dir>_doi_status.csv
+        workers (int): Downloads in flight at once
+        per_host (int): Requests in flight to one host at once
+        timeout (float): Seconds to wait for a server before giving up on a request
+        retry_failed (bool): Only retry DOIs whose last attempt failed
+        mirrors (list): Sci-Hub instances to spread the DOIs over, by default
+            the one of setSciHubUrl and those listed on SciHub_URLs_repo
+        retries (int): Further mirrors to try when one does not answer
+        store_dir (str): pdf_store.py store to move each downloaded PDF into;
+            DOIs already in it are not downloaded again
+
+    Returns:
+        list: Requests, failures, latency and circuit state of each mirror,
+            also saved to <dwnl_dir>/resolver_stats.json
+    """
+    if mirrors is None:
+        setSciHubUrl()
+        mirrors = NetInfo.SciHub_URLs
+    pool = ResolverPool(mirrors, retries)
 
-    downloaded_dois = set(getDownloadedDois(dwnl_dir))
     if not os.path.exists(dwnl_dir):
         os.makedirs(dwnl_dir)
-
-    total_dois = len(doi_l)
-    processed_dois = 0
-
-    csv_file = os.path.join(dwnl_dir, os.path.splitext(args.txt)[0] + '_doi_status.csv')
-    with open(csv_file, mode='w', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow(['DOI', 'Modified DOI', 'Status'])
-
-        for doi in doi_l:
-            processed_dois += 1
-            print(f"Processing {processed_dois} of {total_dois}: {doi}")
-
-            if doi in downloaded_dois:
-                print(f"{doi} already downloaded.")
-                writer.writerow([doi, doi.replace('/', '_'), 'True'])
-                continue
-
-            url = URLjoin(NetInfo.SciHub_URL, doi)
-            r = requests.get(url, headers=NetInfo.HEADERS)
-            content_type = r.headers.get('content-type')
-
-            if 'application/pdf' in content_type:
-                saveFile(dwnl_dir, doi.replace('/', '_') + '.pdf', r.content)
-                print(f"Successfully downloaded {doi}")
-                writer.writerow([doi, doi.replace('/', '_'), 'True'])
-                saveDownloadedDoi(dwnl_dir, doi)
-            elif 'application/pdf' not in content_type:
-                pdf_url = getSchiHubPDF(r.text)
-                if pdf_url is not None:
-                    print(f"Extracted PDF URL: {pdf_url}")
-                    
-                    if not pdf_url.startswith('HTTP'):
-                        pdf_url = urljoin(NetInfo.SciHub_URL, pdf_url)
-
+    if csv_file is None:
+        csv_file = os.path.join(dwnl_dir, dwnl_dir + '_doi_status.csv')
+
+    store = PdfStore(store_dir) if store_dir is not None else None
+    with DownloadJournal(os.path.join(dwnl_dir, JOURNAL_NAME)) as journal:
+        if store is not None:
+            for doi in doi_l:
+                if doi in store and journal.status(doi) != 'True':
+                    journal.record(doi, 'True', os.path.getsize(store.get(doi)))
+        downloaded_dois = journal.downloaded()
+        failed_dois = journal.failed()
+        total_dois = len(doi_l)
+        processed_dois = 0
+
+        def fetch(engine, doi):
+            if doi in downloaded_dois or (retry_failed and doi not in failed_dois):
+                return None
+            return fetchPaper(engine, pool, doi, dwnl_dir)
+
+        # Results come back in DOI order, so the journal is only written from this thread.
+        with DownloadEngine(workers, per_host, timeout, NetInfo.HEADERS) as engine:
+            for doi, result in engine.map(fetch, doi_l):
+                processed_dois += 1
+                print(f"Processing {processed_dois} of {total_dois}: {doi}")
+
+                if result is None:
+                    if doi in downloaded_dois:
+                        print(f"{doi} already downloaded.")
+                    continue
+                journal.record(doi, result.status, result.bytes, result.seconds, result.error)
+                if store is not None and result.status == 'True':
+                    pdf_path = os.path.join(dwnl_dir, doi.replace('/', '_') + '.pdf')
                     try:
-                        r = requests.get(pdf_url, headers=NetInfo.HEADERS)
-                        if 'application/pdf' in r.headers.get('content-type'):
-                            saveFile(dwnl_dir, doi.replace('/', '_') + '.pdf', r.content)
-                            print(f"Successfully downloaded {doi}")
-                            writer.writerow([doi, doi.replace('/', '_'), 'True'])
-                            saveDownloadedDoi(dwnl_dir, doi)
-                        else:
-                            print(f"Failed to download {doi}")
-                            writer.writerow([doi, doi.replace('/', '_'), 'False'])
-                    except Exception as e:
-                        print(f"Error occurred: {e}")
-                        writer.writerow([doi, doi.replace('/', '_'), 'Error'])
-                else:
-                    print(f"Failed to download {doi}")
-                    writer.writerow([doi, doi.replace('/', '_'), 'False'])
-
-        print("All tasks have been completed!")
+                        _, duplicate = store.put(doi, pdf_path)
+                    except OSError as e:
+                        # The PDF stays in dwnl_dir, pdf_store.py ingest can add it later.
+                        print(f"Error processing file {pdf_path}: {e}")
+                        continue
+                    if duplicate:
+                        print(f"{doi} has the same PDF as a stored DOI.")
+
+        journal.write_report(csv_file, doi_l)
+    if store is not None:
+        print(f"PDF store: {json.dumps(store.stats())}")
+        store.close()
+
+    stats = pool.stats()
+    with open(os.path.join(dwnl_dir, 'resolver_stats.json'), 'w', encoding='utf-8') as f:
+        json.dump(stats, f, indent=2)
+    for endpoint in stats:
+        mean_seconds = f"{endpoint['mean_seconds']:.2f}s" if endpoint['mean_seconds'] is not None else '-'
+        print(f"{endpoint['url']}: {endpoint['successes']} of {endpoint['requests']} requests answered, "
+              f"mean {mean_seconds}, circuit {endpoint['circuit']}")
+    print("All tasks have been completed!")
+    return stats
 
 
 def get_doi_l(doi_file):
@@ -209,11 +270,22 @@ def get_doi_l(doi_file):
 def main():
     parser = argparse.ArgumentParser(description='Download papers from Sci-Hub.')
     parser.add_argument('--txt', type=str, required=True, help='The txt file containing the DOIs.')
+    parser.add_argument('--workers', type=int, default=WORKERS, help='Number of papers downloaded at once.')
+    parser.add_argument('--per-host', type=int, default=PER_HOST, help='Maximum requests in flight to one host.')
+    parser.add_argument('--timeout', type=float, default=TIMEOUT, help='Seconds to wait for a server before giving up on a request.')
+    parser.add_argument('--mirror', type=str, action='append', default=None,
+                        help='Sci-Hub instance to use instead of the default ones; repeat to pool several.')
+    parser.add_argument('--retries', type=int, default=RETRIES, help='Further mirrors to try when one does not answer.')
+    parser.add_argument('--retry-failed', action='store_true', help='Only retry DOIs whose last attempt failed.')
+    parser.add_argument('--store', type=str, default=None,
+                        help='Content-addressed PDF store to move downloads into (see pdf_store.py).')
     args = parser.parse_args()
 
     folder_name = os.path.splitext(args.txt)[0]
     DOIs = get_doi_l(args.txt)
-    downloadPapers(DOIs, folder_name)
+    downloadPapers(DOIs, folder_name, workers=args.workers, per_host=args.per_host, timeout=args.timeout,
+                   retry_failed=args.retry_failed, mirrors=args.mirror, retries=args.retries,
+                   store_dir=args.store)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,184 @@
+import os
+import json
+import shutil
+import hashlib
+import argparse
+
+from append_file import truncate_partial_line
+
+INDEX_NAME = 'doi_index.jsonl'
+HASH_CHUNK = 1024 * 1024
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_CHUNK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def copy_file(path, target):
+    shutil.copyfile(path, target + '.tmp')
+    os.replace(target + '.tmp', target)
+
+
+def doi_name(doi):
+    """Filename form of a DOI, as paper_download.py names its PDFs; store keys use it."""
+    return doi.replace('/', '_')
+
+
+class PdfStore:
+    """
+    PDFs kept once per content, under objects/<aa>/<bb>/<sha256>.pdf.
+
+    The two levels of shard folders keep every folder small however many
+    papers are stored. doi_index.jsonl maps each DOI (in its filename form)
+    to the SHA-256 of its PDF, one appended line per DOI, so DOIs that
+    resolve to byte-identical files share one object and later stages
+    (conversion, search) see it once.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.index_path = os.path.join(root, INDEX_NAME)
+        self.names = {}
+        if not os.path.exists(root):
+            os.makedirs(root)
+        if os.path.exists(self.index_path):
+            truncate_partial_line(self.index_path)
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self.names[entry['name']] = entry['sha256']
+        self.f = open(self.index_path, 'a', encoding='utf-8')
+
+    def object_path(self, sha256):
+        return os.path.join(self.root, 'objects', sha256[:2], sha256[2:4], sha256 + '.pdf')
+
+    def __contains__(self, doi):
+        return doi_name(doi) in self.names
+
+    def get(self, doi):
+        """Path of the stored PDF of doi, or None."""
+        sha256 = self.names.get(doi_name(doi))
+        return None if sha256 is None else self.object_path(sha256)
+
+    def put(self, doi, path, move=True):
+        """
+        Store the PDF at path under doi.
+
+        A file whose content is already stored is not kept again; with
+        move=True the source is removed either way.
+
+        Returns:
+            tuple: (SHA-256 of the PDF, True if its content was already stored)
+        """
+        sha256 = file_sha256(path)
+        target = self.object_path(sha256)
+        duplicate = os.path.exists(target)
+        if duplicate:
+            if move:
+                os.remove(path)
+        else:
+            folder = os.path.dirname(target)
+            if not os.path.exists(folder):
+                os.makedirs(folder)
+            if not move:
+                copy_file(path, target)
+            else:
+                try:
+                    os.replace(path, target)
+                except OSError:
+                    # The store is on another file system.
+                    copy_file(path, target)
+                    os.remove(path)
+        name = doi_name(doi)
+        if self.names.get(name) != sha256:
+            self.f.write(json.dumps({'name': name, 'sha256': sha256}) + '\n')
+            self.f.flush()
+            self.names[name] = sha256
+        return sha256, duplicate
+
+    def unique(self):
+        """
+        One entry per stored PDF, in the order their first DOI was added.
+
+        Returns:
+            list: (SHA-256, object path, filename-form DOIs sharing the PDF)
+        """
+        groups = {}
+        for name, sha256 in self.names.items():
+            groups.setdefault(sha256, []).append(name)
+        return [(sha256, self.object_path(sha256), names) for sha256, names in groups.items()]
+
+    def stats(self):
+        unique = self.unique()
+        stored_bytes = 0
+        saved_bytes = 0
+        for _, path, names in unique:
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            stored_bytes += size
+            saved_bytes += size * (len(names) - 1)
+        return {
+            'dois': len(self.names),
+            'pdfs': len(unique),
+            'duplicate_dois': len(self.names) - len(unique),
+            'stored_bytes': stored_bytes,
+            'saved_bytes': saved_bytes,
+        }
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def ingest_directory(store, directory, move=False):
+    """
+    Add every .pdf under directory to the store, keyed by its filename.
+
+    Returns:
+        tuple: (PDFs added, PDFs whose content was already stored)
+    """
+    added = 0
+    duplicates = 0
+    for root, dirs, files in os.walk(directory):
+        for file in files:
+            if file.endswith('.pdf'):
+                try:
+                    _, duplicate = store.put(file[:-len('.pdf')], os.path.join(root, file), move)
+                except OSError as e:
+                    print(f"Error processing file {os.path.join(root, file)}: {e}")
+                    continue
+                added += 1
+                duplicates += duplicate
+    return added, duplicates
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Keep downloaded PDFs once per content, indexed by DOI.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    ingest_parser = subparsers.add_parser('ingest', help='Add a folder of <doi>.pdf files to the store.')
+    ingest_parser.add_argument('--pdfs', type=str, required=True, help='Folder of PDFs named after their DOI.')
+    ingest_parser.add_argument('--store', type=str, required=True, help='Store folder.')
+    ingest_parser.add_argument('--move', action='store_true', help='Remove the PDFs from the folder once stored.')
+
+    stats_parser = subparsers.add_parser('stats', help='Print the number of DOIs, PDFs and duplicates in the store.')
+    stats_parser.add_argument('--store', type=str, required=True, help='Store folder.')
+    args = parser.parse_args()
+
+    with PdfStore(args.store) as store:
+        if args.command == 'ingest':
+            added, duplicates = ingest_directory(store, args.pdfs, args.move)
+            print(f"Stored {added} PDFs, {duplicates} of them duplicates of stored PDFs")
+        print(json.dumps(store.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+import re
+from array import array
+from bisect import bisect_right
+from collections import namedtuple
+
+from term_matcher import build_matcher
+
+# Expression tree nodes. Term.index points into CompiledQueries.terms so that
+# per-file counts can be kept in a plain list shared by every query.
+Term = namedtuple('Term', ['index', 'text'])
+Not = namedtuple('Not', ['left', 'right'])
+And = namedtuple('And', ['children'])
+Or = namedtuple('Or', ['children'])
+# Proximity operators between two terms, answered from term positions.
+Near = namedtuple('Near', ['left', 'right', 'distance'])
+Sentence = namedtuple('Sentence', ['left', 'right'])
+NODE_TYPES = (Term, Not, And, Or, Near, Sentence)
+
+# Word and sentence numbers of the counted matches of one term.
+TermPositions = namedtuple('TermPositions', ['words', 'sentences'])
+
+GROUP_PATTERN = re.compile(r'\(([^()]+)\)')
+PLACEHOLDER_PATTERN = re.compile(r'\x00(\d+)\x00')
+NOT_PATTERN = re.compile(r'\bNOT\b')
+CASE_SUFFIX_PATTERN = re.compile(r'(.*\S)/([ic])')
+PROXIMITY_PATTERN = re.compile(r'\s+(?:NEAR/(\d+)|(SENTENCE))\s+')
+WORD_PATTERN = re.compile(r'\w+')
+SENTENCE_END_PATTERN = re.compile(r'[.!?]+\s+')
+
+
+class CompiledQueries(namedtuple('CompiledQueries', ['queries', 'nodes', 'terms', 'matcher', 'ignore_case', 'positional'])):
+
+    def evaluate(self, counts, positions=None):
+        """
+        Returns:
+            array: Count of each query from per-term counts (and positions,
+                if any query uses NEAR or SENTENCE), in self.queries order
+        """
+        return array('l', evaluate_all(self, counts, positions))
+
+
+def split_term(term, ignore_case=False):
+    """
+    Split a term into its text and case mode.
+
+    A "/c" suffix makes a term case-sensitive and "/i" case-insensitive,
+    e.g. "GSTP1/c AND Breast cancer/i"; a term without suffix uses ignore_case.
+
+    Returns:
+        tuple: (text, ignore_case of the term)
+    """
+    match = CASE_SUFFIX_PATTERN.fullmatch(term)
+    if match:
+        return match.group(1), match.group(2) == 'i'
+    return term, ignore_case
+
+
+def term_label(text, term_ignore_case, ignore_case=False):
+    """Canonical form of a term: its text, suffixed only if its case mode is not the default."""
+    if term_ignore_case == ignore_case:
+        return text
+    return text + ('/i' if term_ignore_case else '/c')
+
+
+def build_terms_matcher(terms, ignore_case=False, engine='auto'):
+    """Build the matcher for term labels as stored in CompiledQueries.terms."""
+    split = [split_term(term, ignore_case) for term in terms]
+    return build_matcher([text for text, _ in split], [term_ignore_case for _, term_ignore_case in split], engine)
+
+
+def node_key(node):
+    """
+    Intern key of a node whose children are already interned.
+
+    Nodes are namedtuples, which compare by value only: And((a, b)) equals
+    Or((a, b)) and Not(a, b) equals Sentence(a, b). The key adds the node
+    type and refers to children by identity, so each keeps its own operator.
+    """
+    key = [type(node)]
+    for field in node:
+        if isinstance(field, NODE_TYPES):
+            key.append(id(field))
+        elif isinstance(field, tuple):
+            key.append(tuple(id(child) for child in field))
+        else:
+            key.append(field)
+    return tuple(key)
+
+
+class QueryCompiler:
+    """
+    Parse query strings into expression trees that share terms and subexpressions.
+
+    Every distinct term gets one slot in `terms`, and identical subtrees are
+    interned, so a term or group used by many queries is counted and
+    evaluated once per file. Terms are stored as labels (see term_label),
+    so "GSTP1" and "GSTP1/c" share a slot when case-sensitive is the default.
+    """
+
+    def __init__(self, ignore_case=False):
+        self.ignore_case = ignore_case
+        self.terms = []
+        self.term_ids = {}
+        self.nodes = {}
+        self.positional = False
+
+    def intern(self, node):
+        return self.nodes.setdefault(node_key(node), node)
+
+    def term(self, text):
+        label = term_label(*split_term(text, self.ignore_case), self.ignore_case)
+        if label not in self.term_ids:
+            self.term_ids[label] = len(self.terms)
+            self.terms.append(label)
+        return self.intern(Term(self.term_ids[label], label))
+
+    def parse(self, query):
+        groups = []
+        sources = []
+
+        def replace_group(match):
+            groups.append(self.parse_block(match.group(1), groups, sources))
+            sources.append(match.group(0))
+            return "\x00{}\x00".format(len(groups) - 1)
+
+        while '(' in query:
+            replaced = GROUP_PATTERN.sub(replace_group, query)
+            if replaced == query:
+                break
+            query = replaced
+
+        return self.parse_block(query, groups, sources)
+
+    def parse_block(self, block, groups, sources):
+        or_parts = [self.parse_and(part, groups, sources) for part in block.split(" OR ")]
+        return or_parts[0] if len(or_parts) == 1 else self.intern(Or(tuple(or_parts)))
+
+    def parse_and(self, part, groups, sources):
+        and_parts = [self.parse_expression(term.strip(), groups, sources) for term in part.split(" AND ")]
+        return and_parts[0] if len(and_parts) == 1 else self.intern(And(tuple(and_parts)))
+
+    def parse_expression(self, expr, groups, sources):
+        if NOT_PATTERN.search(expr):
+            parts = NOT_PATTERN.split(expr)
+            left = self.parse_proximity(parts[0].strip(), groups, sources)
+            right = self.parse_proximity(parts[1].strip(), groups, sources)
+            return self.intern(Not(left, right))
+        return self.parse_proximity(expr, groups, sources)
+
+    def parse_proximity(self, expr, groups, sources):
+        match = PROXIMITY_PATTERN.search(expr)
+        if not match:
+            return self.parse_operand(expr, groups, sources)
+
+        rest = expr[match.end():]
+        if PROXIMITY_PATTERN.search(rest):
+            raise ValueError("NEAR and SENTENCE only combine two terms, they cannot be chained")
+        left = self.parse_operand(expr[:match.start()].strip(), groups, sources)
+        right = self.parse_operand(rest.strip(), groups, sources)
+        if not isinstance(left, Term) or not isinstance(right, Term):
+            raise ValueError("NEAR and SENTENCE only combine two terms, not groups")
+        self.positional = True
+        if match.group(2):
+            return self.intern(Sentence(left, right))
+        return self.intern(Near(left, right, int(match.group(1))))
+
+    def parse_operand(self, expr, groups, sources):
+        match = PLACEHOLDER_PATTERN.fullmatch(expr)
+        if match:
+            return groups[int(match.group(1))]
+
+        # A group inside a phrase, e.g. "Breast (ductal) cancer", is literal text.
+        def restore(match):
+            return restore_text(sources[int(match.group(1))])
+
+        def restore_text(text):
+            return PLACEHOLDER_PATTERN.sub(restore, text)
+
+        return self.term(restore_text(expr))
+
+
+def compile_queries(queries, ignore_case=False, engine='auto'):
+    """
+    Parse every query once and collect the distinct terms they use.
+
+    Args:
+        queries (list): Queries in the AND/OR/NOT syntax of search_case.py
+        ignore_case (bool): Count terms without a /c or /i suffix like search_nocase.py
+        engine (str): Term matching engine, see term_matcher.build_matcher
+
+    Returns:
+        CompiledQueries: The queries, one expression tree per query, the
+            distinct terms and the matcher that counts them
+    """
+    compiler = QueryCompiler(ignore_case)
+    nodes = [compiler.parse(query) for query in queries]
+    matcher = build_terms_matcher(compiler.terms, ignore_case, engine)
+    return CompiledQueries(list(queries), nodes, compiler.terms, matcher, ignore_case, compiler.positional)
+
+
+def count_terms(compiled, content):
+    return compiled.matcher.count(content)
+
+
+def count_terms_stream(compiled, chunks):
+    return compiled.matcher.count_stream(chunks)
+
+
+def sentence_starts(content):
+    """Offsets where sentences start: 0 and after every run of . ! ? followed by whitespace."""
+    return [0] + [match.end() for match in SENTENCE_END_PATTERN.finditer(content)]
+
+
+def offsets_to_positions(offsets, word_starts, sentences):
+    """
+    Turn match start offsets into TermPositions.
+
+    A match belongs to the word it starts in (or the word before, if it
+    starts between words) and to the sentence it starts in.
+    """
+    words = [bisect_right(word_starts, offset) - 1 for offset in offsets]
+    sentence_ids = [bisect_right(sentences, offset) - 1 for offset in offsets]
+    return TermPositions(words, sentence_ids)
+
+
+def locate_terms(compiled, content):
+    """
+    Count every term in content and record where each match is.
+
+    Returns:
+        tuple: (list of term counts, list of TermPositions per term)
+    """
+    starts = compiled.matcher.locate(content)
+    word_starts = [match.start() for match in WORD_PATTERN.finditer(content)]
+    sentences = sentence_starts(content)
+    positions = [offsets_to_positions(offsets, word_starts, sentences) for offsets in starts]
+    return [len(offsets) for offsets in starts], positions
+
+
+def count_near(left, right, distance):
+    """Number of left words with a right word at most distance words away; both lists sorted."""
+    count = 0
+    j = 0
+    for word in left:
+        while j < len(right) and right[j] < word - distance:
+            j += 1
+        if j < len(right) and right[j] <= word + distance:
+            count += 1
+    return count
+
+
+def count_same_sentence(left, right):
+    """Number of left matches whose sentence also holds a right match; both lists sorted."""
+    count = 0
+    j = 0
+    for sentence in left:
+        while j < len(right) and right[j] < sentence:
+            j += 1
+        if j < len(right) and right[j] == sentence:
+            count += 1
+    return count
+
+
+def evaluate(node, counts, memo=None, positions=None):
+    """
+    Evaluate an expression tree over per-term counts.
+
+    OR takes the maximum, AND the minimum (0 if any part is 0) and
+    "A NOT B" gives max(A - B, 0), exactly as evaluate_query does. The memo
+    is keyed by node identity, which is safe because compile_queries interns
+    identical subtrees.
+
+    "A NEAR/k B" counts the matches of A with a match of B at most k words
+    before or after it, and "A SENTENCE B" the matches of A in a sentence
+    that also contains B. Both need positions, one TermPositions per term.
+    """
+    if memo is not None and id(node) in memo:
+        return memo[id(node)]
+
+    if isinstance(node, Term):
+        value = counts[node.index]
+    elif isinstance(node, (Near, Sentence)):
+        if positions is None:
+            raise ValueError("NEAR and SENTENCE need term positions, search with positions or a positional index")
+        if not counts[node.left.index] or not counts[node.right.index]:
+            value = 0
+        elif isinstance(node, Near):
+            value = count_near(positions[node.left.index].words, positions[node.right.index].words, node.distance)
+        else:
+            value = count_same_sentence(positions[node.left.index].sentences, positions[node.right.index].sentences)
+    elif isinstance(node, Not):
+        value = max(evaluate(node.left, counts, memo, positions) - evaluate(node.right, counts, memo, positions), 0)
+    elif isinstance(node, And):
+        value = 0
+        for i, child in enumerate(node.children):
+            child_value = evaluate(child, counts, memo, positions)
+            if not child_value:
+                value = 0
+                break
+            value = child_value if i == 0 else min(value, child_value)
+    else:
+        value = max(evaluate(child, counts, memo, positions) for child in node.children)
+
+    if memo is not None:
+        memo[id(node)] = value
+    return value
+
+
+def evaluate_all(compiled, counts, positions=None):
+    memo = {}
+    return [evaluate(node, counts, memo, positions) for node in compiled.nodes]
@@ -0,0 +1,131 @@
+import time
+import itertools
+from collections import namedtuple
+
+import numpy as np
+
+from query_compiler import QueryCompiler, build_terms_matcher, evaluate
+
+
+class GridQueries:
+    """
+    Lazy sequence of the query strings of a grid, in itertools.product order.
+
+    Strings are only built when indexed or iterated, e.g. to label output.
+    """
+
+    def __init__(self, dimensions):
+        self.dimensions = dimensions
+        self.strides = []
+        stride = 1
+        for values in reversed(dimensions):
+            self.strides.insert(0, stride)
+            stride *= len(values)
+        self.size = stride if dimensions else 0
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.size
+        if not 0 <= i < self.size:
+            raise IndexError(i)
+        return self.join(values[i // stride % len(values)] for values, stride in zip(self.dimensions, self.strides))
+
+    def __iter__(self):
+        for combination in itertools.product(*self.dimensions):
+            yield self.join(combination)
+
+    @staticmethod
+    def join(values):
+        # Values containing OR are grouped so that the string parses to the
+        # same AND of values that the grid evaluates.
+        return " AND ".join(f"({value})" if " OR " in value else value for value in values)
+
+
+class QueryGrid:
+    """
+    Cartesian product of AND conjuncts, e.g. gene x disease x fixed terms x method.
+
+    Args:
+        dimensions (list): One list of values per position in the query; a
+            plain string is a fixed conjunct shared by every query. Values use
+            the AND/OR/NOT syntax of search_case.py
+
+    Example:
+        QueryGrid([["GSTP1", "MLH1"], ["Breast cancer", "Lung cancer"],
+                   "DNA methylation", "patient", ["PCR", "sequencing"]])
+        stands for the 8 queries "GSTP1 AND Breast cancer AND DNA methylation
+        AND patient AND PCR", ... in itertools.product order.
+    """
+
+    def __init__(self, dimensions):
+        self.dimensions = [[values] if isinstance(values, str) else list(values) for values in dimensions]
+        self.queries = GridQueries(self.dimensions)
+
+    def __len__(self):
+        return len(self.queries)
+
+    def __iter__(self):
+        return iter(self.queries)
+
+    def compile(self, ignore_case=False, engine='auto'):
+        compiler = QueryCompiler(ignore_case)
+        nodes = [[compiler.parse(value) for value in values] for values in self.dimensions]
+        matcher = build_terms_matcher(compiler.terms, ignore_case, engine)
+        return CompiledGrid(self.queries, nodes, compiler.terms, matcher, ignore_case, compiler.positional)
+
+
+class CompiledGrid(namedtuple('CompiledGrid', ['queries', 'nodes', 'terms', 'matcher', 'ignore_case', 'positional'])):
+    """
+    A QueryGrid parsed once, usable wherever CompiledQueries is.
+
+    nodes holds one list of expression trees per dimension.
+    """
+
+    def evaluate(self, counts, positions=None, node_costs=None):
+        """
+        Count every query of the grid from per-term counts.
+
+        Each dimension value is evaluated once per file. The AND over the
+        dimensions (the minimum, 0 if any value is 0) is then built from
+        shared partial products, keeping only the nonzero combinations, so
+        a zero conjunct drops its whole branch at once.
+
+        node_costs, one float array per dimension, gets the seconds spent
+        evaluating each dimension value added to it (for profiling).
+
+        Returns:
+            ndarray: int32 count per query, in self.queries order
+        """
+        result = np.zeros(len(self.queries), dtype=np.int32)
+        if not len(self.queries):
+            return result
+        memo = {}
+        dimensions = []
+        for dimension, (nodes, stride) in enumerate(zip(self.nodes, self.queries.strides)):
+            if node_costs is None:
+                values = [evaluate(node, counts, memo, positions) for node in nodes]
+            else:
+                values = []
+                for k, node in enumerate(nodes):
+                    start = time.perf_counter()
+                    values.append(evaluate(node, counts, memo, positions))
+                    node_costs[dimension][k] += time.perf_counter() - start
+            values = np.array(values, dtype=np.int64)
+            nonzero = np.flatnonzero(values)
+            if not nonzero.size:
+                return result
+            dimensions.append((nonzero.size, nonzero, values[nonzero], stride))
+
+        # Combining the most selective dimensions first keeps the partial
+        # products small.
+        flat_indices = np.zeros(1, dtype=np.int64)
+        minimum = np.full(1, np.iinfo(np.int64).max, dtype=np.int64)
+        for _, nonzero, values, stride in sorted(dimensions, key=lambda dimension: dimension[0]):
+            flat_indices = (flat_indices[:, None] + nonzero * stride).ravel()
+            minimum = np.minimum.outer(minimum, values).ravel()
+
+        result[flat_indices] = minimum
+        return result
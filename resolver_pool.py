@@ -0,0 +1,183 @@
+import time
+import random
+import threading
+
+import requests
+
+RETRIES = 3
+BACKOFF = 0.5
+MAX_BACKOFF = 30.0
+FAILURE_THRESHOLD = 5
+COOLDOWN = 60.0
+# Weight of the newest response time in an endpoint's moving average.
+LATENCY_SMOOTHING = 0.3
+
+
+class Endpoint:
+    """Health of one resolver: counts, smoothed latency and circuit state."""
+
+    def __init__(self, url):
+        self.url = url
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.latency = None
+        self.total_seconds = 0.0
+        self.open_until = 0.0
+        # Set when the circuit opens and cleared by the next success: once
+        # open_until has passed, the circuit is half-open and lets through
+        # one trial request at a time, marked by probing.
+        self.tripped = False
+        self.probing = False
+        self.times_opened = 0
+
+    def success_rate(self):
+        # Smoothed so a new endpoint starts at 1/2 instead of 0 or 1.
+        return (self.successes + 1) / (self.successes + self.failures + 2)
+
+    def available(self, now):
+        return not self.tripped or (self.open_until <= now and not self.probing)
+
+    def circuit(self, now):
+        if not self.tripped:
+            return 'closed'
+        return 'open' if self.open_until > now else 'half-open'
+
+    def stats(self, now):
+        requests_made = self.successes + self.failures
+        return {
+            'url': self.url,
+            'requests': requests_made,
+            'successes': self.successes,
+            'failures': self.failures,
+            'success_rate': self.successes / requests_made if requests_made else None,
+            'mean_seconds': self.total_seconds / requests_made if requests_made else None,
+            'smoothed_seconds': self.latency,
+            'circuit': self.circuit(now),
+            'times_opened': self.times_opened,
+        }
+
+
+class ResolverPool:
+    """
+    Mirrors that resolve DOIs, picked per request by their observed health.
+
+    Each request goes to a random endpoint weighted by success rate over
+    smoothed latency, so fast and reliable mirrors take most of the load
+    while the others are still probed. failure_threshold failures in a row
+    open an endpoint's circuit: it gets no requests for cooldown seconds,
+    then it is half-open and gets one trial request at a time until one
+    succeeds and closes it; a failed trial opens it again. When no endpoint
+    can take a request, callers wait for a circuit to reopen or a trial to
+    end. Failed requests are retried on an endpoint not yet tried for them,
+    when one can take a request, after an exponential backoff with full jitter.
+    """
+
+    def __init__(self, urls, retries=RETRIES, backoff=BACKOFF, max_backoff=MAX_BACKOFF,
+                 failure_threshold=FAILURE_THRESHOLD, cooldown=COOLDOWN, seed=None):
+        if not urls:
+            raise ValueError("A resolver pool needs at least one endpoint")
+        self.endpoints = [Endpoint(url) for url in dict.fromkeys(urls)]
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        # Notified on every report, so callers waiting in choose() look again.
+        self.changed = threading.Condition(self.lock)
+
+    def weight(self, endpoint, default_latency):
+        latency = endpoint.latency if endpoint.latency is not None else default_latency
+        return endpoint.success_rate() / max(latency, 0.001)
+
+    def choose(self, tried=()):
+        """
+        Args:
+            tried (set): Endpoints to pass over while another one can take the request
+
+        Returns:
+            tuple: (Endpoint, True if the request is the trial request of a half-open circuit)
+        """
+        with self.changed:
+            while True:
+                now = time.monotonic()
+                available = [endpoint for endpoint in self.endpoints if endpoint.available(now)]
+                if available:
+                    break
+                # Every circuit is open or has its trial request in flight.
+                reopen = [endpoint.open_until for endpoint in self.endpoints if endpoint.open_until > now]
+                self.changed.wait(min(reopen) - now if reopen else None)
+            untried = [endpoint for endpoint in available if endpoint not in tried]
+            if untried:
+                available = untried
+            known = [endpoint.latency for endpoint in available if endpoint.latency is not None]
+            default_latency = sum(known) / len(known) if known else 1.0
+            weights = [self.weight(endpoint, default_latency) for endpoint in available]
+            endpoint = self.random.choices(available, weights)[0]
+            probe = endpoint.tripped
+            endpoint.probing = endpoint.probing or probe
+            return endpoint, probe
+
+    def report(self, endpoint, ok, seconds, probe=False):
+        with self.changed:
+            self.changed.notify_all()
+            if probe:
+                endpoint.probing = False
+            endpoint.total_seconds += seconds
+            if endpoint.latency is None:
+                endpoint.latency = seconds
+            else:
+                endpoint.latency += LATENCY_SMOOTHING * (seconds - endpoint.latency)
+            if ok:
+                endpoint.successes += 1
+                endpoint.consecutive_failures = 0
+                endpoint.tripped = False
+                return
+            endpoint.failures += 1
+            endpoint.consecutive_failures += 1
+            if endpoint.consecutive_failures >= self.failure_threshold:
+                endpoint.open_until = time.monotonic() + self.cooldown
+                endpoint.times_opened += 1
+                endpoint.tripped = True
+
+    def backoff_delay(self, attempt):
+        return self.random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def call(self, request):
+        """
+        Run request(endpoint url) until an endpoint answers, at most retries + 1 times.
+
+        request signals a failed endpoint by raising requests.RequestException
+        (connection errors, timeouts, server errors); any other exception is
+        passed on at once and counts as an answer. Each retry goes to an
+        endpoint not tried yet while one can take the request.
+
+        Returns:
+            The result of the first request that does not fail
+        """
+        tried = set()
+        for attempt in range(self.retries + 1):
+            endpoint, probe = self.choose(tried)
+            start = time.perf_counter()
+            try:
+                result = request(endpoint.url)
+            except requests.RequestException:
+                self.report(endpoint, False, time.perf_counter() - start, probe)
+                tried.add(endpoint)
+                if attempt == self.retries:
+                    raise
+                time.sleep(self.backoff_delay(attempt))
+                continue
+            except Exception:
+                self.report(endpoint, True, time.perf_counter() - start, probe)
+                raise
+            self.report(endpoint, True, time.perf_counter() - start, probe)
+            return result
+
+    def stats(self):
+        """Per-endpoint counts, latencies and circuit state for the run summary."""
+        now = time.monotonic()
+        with self.lock:
+            return [endpoint.stats(now) for endpoint in self.endpoints]
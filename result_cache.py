@@ -0,0 +1,230 @@
+import os
+import json
+import hashlib
+
+import numpy as np
+
+from corpus_pack import is_pack
+from query_compiler import And, Near, Not, Or, Sentence, Term, compile_queries, split_term
+from query_grid import CompiledGrid, QueryGrid
+from search_engine import search_to_matrix
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# Part of every entry's name; entries of another version are never read and age out.
+CACHE_VERSION = 2
+
+
+def corpus_fingerprint(corpus, index_path=None):
+    """
+    Version of a corpus that changes whenever a paper is added, removed or edited.
+
+    With the path of a search_index.py index, the fingerprint is built from
+    the SHA-256 of every paper recorded in it (refresh the index first);
+    otherwise from the path, size and mtime of every .txt file (or of the
+    .pack file), which needs no file reads.
+    """
+    digest = hashlib.sha256()
+    if index_path is not None:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        for rel_path in sorted(index['files']):
+            digest.update(f"{rel_path}\0{index['files'][rel_path]['sha256']}\n".encode('utf-8'))
+    elif is_pack(corpus):
+        stat = os.stat(corpus)
+        digest.update(f"{os.path.abspath(corpus)}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode('utf-8'))
+    else:
+        entries = []
+        for root, dirs, files in os.walk(corpus):
+            for file in files:
+                if file.endswith('.txt'):
+                    file_path = os.path.join(root, file)
+                    stat = os.stat(file_path)
+                    entries.append(f"{os.path.relpath(file_path, corpus)}\0{stat.st_size}\0{stat.st_mtime_ns}\n")
+        for entry in sorted(entries):
+            digest.update(entry.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def node_parts(node, terms, ignore_case, kind):
+    """Normalized operands of node, with nested nodes of the same kind flattened."""
+    if isinstance(node, kind):
+        parts = set()
+        for child in node.children:
+            parts.update(node_parts(child, terms, ignore_case, kind))
+        return parts
+    return {normalize_node(node, terms, ignore_case)}
+
+
+def join_parts(name, parts):
+    # AND and OR of a single operand are the operand itself.
+    if len(parts) == 1:
+        return next(iter(parts))
+    return f"{name}({','.join(sorted(parts))})"
+
+
+def normalize_node(node, terms, ignore_case):
+    """
+    Canonical text of an expression tree.
+
+    Every term carries its case mode, and the operands of AND and OR are
+    flattened, deduplicated and sorted, since min and max ignore order and
+    repetition. "A AND B" and "B AND A" thus share one cache entry.
+    """
+    if isinstance(node, Term):
+        text, term_ignore_case = split_term(terms[node.index], ignore_case)
+        return json.dumps(text) + ('/i' if term_ignore_case else '/c')
+    if isinstance(node, Near):
+        return f"NEAR/{node.distance}({normalize_node(node.left, terms, ignore_case)},{normalize_node(node.right, terms, ignore_case)})"
+    if isinstance(node, Sentence):
+        return f"SENTENCE({normalize_node(node.left, terms, ignore_case)},{normalize_node(node.right, terms, ignore_case)})"
+    if isinstance(node, Not):
+        return f"NOT({normalize_node(node.left, terms, ignore_case)},{normalize_node(node.right, terms, ignore_case)})"
+    kind = And if isinstance(node, And) else Or
+    return join_parts(kind.__name__.upper(), node_parts(node, terms, ignore_case, kind))
+
+
+def query_keys(compiled):
+    """Normalized text of every query of CompiledQueries or a CompiledGrid, in query order."""
+    if not isinstance(compiled, CompiledGrid):
+        return [normalize_node(node, compiled.terms, compiled.ignore_case) for node in compiled.nodes]
+    dimensions = [[node_parts(node, compiled.terms, compiled.ignore_case, And) for node in nodes] for nodes in compiled.nodes]
+    keys = []
+    for i in range(len(compiled.queries)):
+        parts = set()
+        for values, stride in zip(dimensions, compiled.queries.strides):
+            parts.update(values[i // stride % len(values)])
+        keys.append(join_parts('AND', parts))
+    return keys
+
+
+class ResultCache:
+    """
+    Per-query file counts on disk, keyed by corpus fingerprint and normalized query.
+
+    Each entry holds the nonzero rows and counts of one query's column of the
+    files x queries matrix, aligned with the file list stored once per
+    fingerprint. Files are listed by their path relative to the corpus, as
+    search_index.py keys them, since papers of different subfolders can
+    share a filename. Reads refresh an entry's mtime, and writes evict the
+    least recently used entries until the cache fits in max_bytes. Entries
+    of an older corpus version are never read again and age out the same
+    way.
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+    def path(self, fingerprint, key):
+        name = hashlib.sha256(f"{CACHE_VERSION}\0{fingerprint}\0{key}".encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, name + '.npz')
+
+    def load(self, path):
+        try:
+            with np.load(path) as data:
+                entry = {name: data[name] for name in data.files}
+            os.utime(path)
+            return entry
+        except (OSError, ValueError):
+            return None
+
+    def store(self, path, **arrays):
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    def get_files(self, fingerprint):
+        entry = self.load(self.path(fingerprint, 'files'))
+        return None if entry is None else entry['files'].tolist()
+
+    def put_files(self, fingerprint, files):
+        self.store(self.path(fingerprint, 'files'), files=np.array(files, dtype=str))
+
+    def get(self, fingerprint, key):
+        """
+        Returns:
+            tuple: (row indices, counts) of the query's nonzero files, or None
+        """
+        entry = self.load(self.path(fingerprint, key))
+        if entry is None or entry['key'] != key:
+            return None
+        return entry['rows'], entry['counts']
+
+    def put(self, fingerprint, key, column):
+        rows = np.flatnonzero(column)
+        self.store(self.path(fingerprint, key), key=np.array(key), rows=rows, counts=column[rows])
+
+    def evict(self):
+        """Delete the least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.npz') and not name.endswith('.tmp.npz'):
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((stat.st_mtime_ns, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
+            total -= size
+
+
+def cached_search_to_matrix(directory, queries, cache_dir, ignore_case=False, max_bytes=DEFAULT_MAX_BYTES,
+                            index_path=None, **search_options):
+    """
+    search_to_matrix that only searches for queries not cached for this corpus version.
+
+    Args:
+        directory (str): Folder of .txt papers or .pack file
+        queries (list or QueryGrid): Queries to count
+        cache_dir (str): Folder holding the cache entries
+        max_bytes (int): Size bound of the cache folder
+        index_path (str): Index whose file hashes give the corpus fingerprint
+        search_options: Passed on to search_to_matrix (processes, chunksize, ...)
+
+    Returns:
+        tuple: (int32 matrix, list of row filenames, list of column queries),
+            as search_to_matrix
+    """
+    compiled = queries.compile(ignore_case) if isinstance(queries, QueryGrid) else compile_queries(queries, ignore_case)
+    keys = query_keys(compiled)
+    cache = ResultCache(cache_dir, max_bytes)
+    fingerprint = corpus_fingerprint(directory, index_path)
+
+    files = cache.get_files(fingerprint)
+    columns = {}
+    if files is not None:
+        for j, key in enumerate(keys):
+            hit = cache.get(fingerprint, key)
+            if hit is not None:
+                columns[j] = hit
+    missing = [j for j in range(len(keys)) if j not in columns]
+    print(f"Result cache: {len(columns)} of {len(keys)} queries reused")
+
+    if missing:
+        search_queries = queries if len(missing) == len(keys) else [compiled.queries[j] for j in missing]
+        searched, searched_files, _ = search_to_matrix(directory, search_queries, ignore_case, relative_paths=True,
+                                                       **search_options)
+        if files is None:
+            files = list(searched_files)
+            cache.put_files(fingerprint, files)
+        elif searched_files != files:
+            rows = {file: i for i, file in enumerate(searched_files)}
+            if len(rows) != len(searched_files) or set(rows) != set(files):
+                raise ValueError(f"Cached file list does not match the search of {directory}, clear {cache_dir}")
+            searched = searched[[rows[file] for file in files]]
+        for column, j in enumerate(missing):
+            cache.put(fingerprint, keys[j], searched[:, column])
+        cache.evict()
+
+    matrix = np.zeros((len(files), len(keys)), dtype=np.int32)
+    for j, (rows, counts) in columns.items():
+        matrix[rows, j] = counts
+    if missing:
+        matrix[:, missing] = searched
+    return matrix, [os.path.basename(file) for file in files], compiled.queries
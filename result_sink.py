@@ -0,0 +1,273 @@
+import os
+import csv
+import json
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from append_file import truncate_partial_line
+from count_matrix import save_file_counts_to_csv, save_matrix
+from query_compiler import compile_queries
+from query_grid import QueryGrid
+from search_engine import iter_corpus
+
+ROWS_PER_PART = 1000
+
+
+class ResultAggregates:
+    """
+    Number of files per query with at least each threshold of occurrences.
+
+    Memory is one counter per query and threshold, however many files are added.
+    """
+
+    def __init__(self, query_count, thresholds):
+        self.files = 0
+        self.files_at = {threshold: np.zeros(query_count, dtype=np.int64) for threshold in thresholds}
+
+    def add(self, counts):
+        counts = np.asarray(counts)
+        self.files += 1
+        for threshold, files_at in self.files_at.items():
+            files_at += counts >= threshold
+
+
+class ResultSink(ABC):
+    """
+    Write per-file query counts as they arrive, so an interrupted run keeps its output.
+
+    Subclasses write one format. Opening with resume=True reads the existing
+    output back: done holds the files already written, which the next run
+    skips, and the aggregates count them again. Files written afterwards are
+    not added to done, so a run holds no per-file state.
+    """
+
+    def __init__(self, path, queries, thresholds=(1, 5), resume=False):
+        self.path = path
+        self.queries = list(queries)
+        self.aggregates = ResultAggregates(len(self.queries), thresholds)
+        self.done = set()
+        folder = os.path.dirname(path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        if resume and self.exists():
+            self.resume()
+        else:
+            self.start()
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    @abstractmethod
+    def start(self):
+        """Create empty output."""
+
+    @abstractmethod
+    def resume(self):
+        """Read the existing output back into done and aggregates, and carry on writing after it."""
+
+    def write(self, file, counts):
+        self.write_row(file, counts)
+        self.aggregates.add(counts)
+
+    @abstractmethod
+    def write_row(self, file, counts):
+        """Write the counts of one file."""
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def save_statistics(self, output_path, high_freq_threshold=5, thresholds=()):
+        """Write the same summary CSVs as save_matrix_statistics_to_csv, from the aggregates."""
+        save_file_counts_to_csv(self.queries, self.aggregates.files_at, output_path, high_freq_threshold, thresholds)
+
+
+class CsvSink(ResultSink):
+    """One row per file: the filename, then the count of every query."""
+
+    def start(self):
+        self.f = open(self.path, 'w', encoding='utf-8', newline='')
+        self.writer = csv.writer(self.f)
+        self.writer.writerow(['File'] + self.queries)
+        self.f.flush()
+
+    def resume(self):
+        truncate_partial_line(self.path)
+        with open(self.path, 'r', encoding='utf-8', newline='') as f:
+            reader = csv.reader(f)
+            if next(reader, None) != ['File'] + self.queries:
+                raise ValueError(f"{self.path} holds results of other queries, it cannot be resumed")
+            for row in reader:
+                self.done.add(row[0])
+                self.aggregates.add(np.array(row[1:], dtype=np.int64))
+        self.f = open(self.path, 'a', encoding='utf-8', newline='')
+        self.writer = csv.writer(self.f)
+
+    def write_row(self, file, counts):
+        self.writer.writerow([file, *counts])
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+class JsonlSink(ResultSink):
+    """A first line listing the queries, then one line per file with its nonzero counts."""
+
+    def start(self):
+        self.f = open(self.path, 'w', encoding='utf-8')
+        self.f.write(json.dumps({'queries': self.queries}, ensure_ascii=False) + '\n')
+        self.f.flush()
+
+    def resume(self):
+        truncate_partial_line(self.path)
+        columns = {query: j for j, query in enumerate(self.queries)}
+        with open(self.path, 'r', encoding='utf-8') as f:
+            header = f.readline()
+            if not header or json.loads(header).get('queries') != self.queries:
+                raise ValueError(f"{self.path} holds results of other queries, it cannot be resumed")
+            for line in f:
+                record = json.loads(line)
+                counts = np.zeros(len(self.queries), dtype=np.int64)
+                for query, count in record['counts'].items():
+                    counts[columns[query]] = count
+                self.done.add(record['file'])
+                self.aggregates.add(counts)
+        self.f = open(self.path, 'a', encoding='utf-8')
+
+    def write_row(self, file, counts):
+        nonzero = {self.queries[j]: int(counts[j]) for j in np.flatnonzero(np.asarray(counts))}
+        self.f.write(json.dumps({'file': file, 'counts': nonzero}, ensure_ascii=False) + '\n')
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+class MatrixSink(ResultSink):
+    """
+    Rows of the count matrix, saved in parts of rows_per_part files.
+
+    Parts go to a <path>.parts folder as they fill up, so memory holds at
+    most one part. merge() joins them into the .npz or .parquet matrix
+    of count_matrix.save_matrix and removes the parts.
+    """
+
+    def __init__(self, path, queries, thresholds=(1, 5), resume=False, rows_per_part=ROWS_PER_PART):
+        self.parts_dir = path + '.parts'
+        self.rows_per_part = rows_per_part
+        self.rows = []
+        self.files = []
+        super().__init__(path, queries, thresholds, resume)
+
+    def exists(self):
+        return os.path.exists(self.parts_dir)
+
+    def part_paths(self):
+        if not os.path.exists(self.parts_dir):
+            return []
+        return sorted(os.path.join(self.parts_dir, name) for name in os.listdir(self.parts_dir)
+                      if name.startswith('part-') and name.endswith('.npz'))
+
+    def start(self):
+        if os.path.exists(self.parts_dir):
+            for part_path in self.part_paths():
+                os.remove(part_path)
+        else:
+            os.makedirs(self.parts_dir)
+
+    def resume(self):
+        for part_path in self.part_paths():
+            with np.load(part_path) as data:
+                if data['queries'].tolist() != self.queries:
+                    raise ValueError(f"{part_path} holds results of other queries, it cannot be resumed")
+                for file, counts in zip(data['files'].tolist(), data['counts']):
+                    self.done.add(file)
+                    self.aggregates.add(counts)
+
+    def write_row(self, file, counts):
+        self.files.append(file)
+        self.rows.append(np.asarray(counts, dtype=np.int32))
+        if len(self.rows) >= self.rows_per_part:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        part_path = os.path.join(self.parts_dir, f"part-{len(self.part_paths()):05d}.npz")
+        tmp_path = part_path + '.tmp.npz'
+        np.savez(tmp_path, counts=np.vstack(self.rows), files=np.array(self.files, dtype=str),
+                 queries=np.array(self.queries, dtype=str))
+        os.replace(tmp_path, part_path)
+        self.rows = []
+        self.files = []
+
+    def close(self):
+        self.flush()
+
+    def merge(self):
+        """Join the parts into the matrix file at path."""
+        self.flush()
+        counts = []
+        files = []
+        part_paths = self.part_paths()
+        for part_path in part_paths:
+            with np.load(part_path) as data:
+                counts.append(data['counts'])
+                files.extend(data['files'].tolist())
+        matrix = np.vstack(counts) if counts else np.zeros((0, len(self.queries)), dtype=np.int32)
+        save_matrix(self.path, matrix, files, self.queries)
+        for part_path in part_paths:
+            os.remove(part_path)
+        os.rmdir(self.parts_dir)
+
+
+SINKS = {
+    '.csv': CsvSink,
+    '.jsonl': JsonlSink,
+    '.npz': MatrixSink,
+    '.parquet': MatrixSink,
+}
+
+
+def open_sink(path, queries, thresholds=(1, 5), resume=False):
+    """Open the sink for the format given by the extension of path."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in SINKS:
+        raise ValueError(f"Unknown result format {extension}, use one of {', '.join(SINKS)}")
+    return SINKS[extension](path, queries, thresholds, resume)
+
+
+def search_to_sink(directory, queries, sink_path, ignore_case=False, resume=False, high_freq_threshold=5, thresholds=(),
+                   engine='auto', **search_options):
+    """
+    Search the corpus and stream each file's counts to sink_path as it completes.
+
+    Files are named by their path relative to directory, so papers of
+    different subfolders sharing a filename are told apart. With
+    resume=True, files already in sink_path are not searched again.
+
+    Returns:
+        ResultSink: The closed sink, whose aggregates cover every written file
+    """
+    if isinstance(queries, QueryGrid):
+        compiled = queries.compile(ignore_case, engine)
+    else:
+        compiled = compile_queries(queries, ignore_case, engine)
+    sink = open_sink(sink_path, compiled.queries, sorted({1, high_freq_threshold, *thresholds}), resume)
+    if sink.done:
+        print(f"Resuming {sink_path}: {len(sink.done)} files already written")
+
+    with sink:
+        _, search = iter_corpus(directory, compiled, exclude=frozenset(sink.done), relative_paths=True, **search_options)
+        for file, counts, *_ in search:
+            sink.write(file, counts)
+    if isinstance(sink, MatrixSink):
+        sink.merge()
+    return sink
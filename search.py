@@ -0,0 +1,129 @@
+import os
+import re
+import argparse
+from collections import Counter
+from contextlib import nullcontext
+
+import search_engine
+from result_cache import cached_search_to_matrix
+from result_sink import search_to_sink
+from search_profile import Profile, profile_search
+from snippets import SnippetOptions
+from query_grid import QueryGrid
+from query_compiler import compile_queries, count_terms, evaluate_all
+from count_matrix import results_to_matrix, save_matrix, save_matrix_statistics_to_csv
+
+def count_occurrences(content, expr, ignore_case=False):
+    pattern = re.compile(re.escape(expr), re.IGNORECASE if ignore_case else 0)
+    return len(pattern.findall(content))
+
+def evaluate_query(content, query, ignore_case=False):
+    compiled = compile_queries([query], ignore_case=ignore_case)
+    return evaluate_all(compiled, count_terms(compiled, content))[0]
+
+def process_file(file_info):
+    root, file, compiled = file_info
+    file_path = os.path.join(root, file)
+    results = Counter()
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+            counts = count_terms(compiled, content)
+            for query, count in zip(compiled.queries, evaluate_all(compiled, counts)):
+                results[query] = count
+    except Exception as e:
+        print(f"Error processing file {file_path}: {e}")
+    return (file, results)
+
+def process_directory(directory, queries, ignore_case=False, processes=None, chunksize=None, unordered=False):
+    return search_engine.process_directory(directory, queries, ignore_case=ignore_case, processes=processes,
+                                           chunksize=chunksize, unordered=unordered)
+
+def save_query_statistics_to_csv(results, output_path, queries=None):
+    matrix, files, queries = results_to_matrix(results, queries)
+    save_matrix_statistics_to_csv(matrix, queries, output_path)
+
+def main(ignore_case=False):
+    parser = argparse.ArgumentParser(description='Keyword search over the .txt papers.')
+    parser.add_argument('--directory', type=str, default=r'G:\cancer', help='Folder containing the .txt papers.')
+    parser.add_argument('--output', type=str, default=r'E:\biomarker\fan\1221\1221_matric_2.csv', help='Path of the statistics CSV.')
+    parser.add_argument('--processes', type=int, default=None, help='Worker processes, defaults to the number of cores.')
+    parser.add_argument('--chunksize', type=int, default=None, help='Files sent to a worker per task, defaults to about four tasks per worker.')
+    parser.add_argument('--unordered', action='store_true', help='Collect results as files complete instead of in directory order.')
+    parser.add_argument('--stream-threshold', type=int, default=64, help='Read files larger than this many MiB in chunks.')
+    parser.add_argument('--chunk-size', type=int, default=4, help='Chunk size in MiB for streamed files.')
+    parser.add_argument('--ignore-case', action='store_true', default=ignore_case,
+                        help='Match terms without a /c or /i suffix case-insensitively.')
+    parser.add_argument('--signatures', type=str, default=None,
+                        help='Trigram signatures from doc_signatures.py, used to skip papers no query can match.')
+    parser.add_argument('--cache', type=str, default=None,
+                        help='Folder of cached per-query counts, reused while the corpus is unchanged.')
+    parser.add_argument('--cache-size', type=int, default=256, help='Size bound of the cache folder in MiB.')
+    parser.add_argument('--snippets', type=str, default=None, help='JSONL file for the context of matches in high-count files.')
+    parser.add_argument('--snippet-threshold', type=int, default=5, help='Minimum query count for a file to get snippets.')
+    parser.add_argument('--snippet-window', type=int, default=80, help='Characters of context on each side of a match.')
+    parser.add_argument('--snippet-limit', type=int, default=5, help='Maximum snippets per file and query.')
+    parser.add_argument('--profile', type=str, default=None, help='JSON file for per-stage timings of the run.')
+    parser.add_argument('--trace', type=str, default=None, help='Also write a Chrome trace of the run (needs --profile).')
+    parser.add_argument('--sink', type=str, default=None,
+                        help='Write per-file counts as files complete, to a .csv, .jsonl, .npz or .parquet file.')
+    parser.add_argument('--resume', action='store_true', help='Continue an interrupted --sink run, skipping written files.')
+    args = parser.parse_args()
+    if args.cache and args.snippets:
+        parser.error("--snippets needs every query searched, it cannot be combined with --cache")
+    if args.profile and (args.cache or args.snippets or args.signatures or not os.path.isdir(args.directory)):
+        parser.error("--profile times a plain search of a folder, without --cache, --snippets or --signatures")
+    if args.trace and not args.profile:
+        parser.error("--trace needs --profile")
+    if args.sink and (args.cache or args.snippets or args.profile):
+        parser.error("--sink cannot be combined with --cache, --snippets or --profile")
+    if args.resume and not args.sink:
+        parser.error("--resume needs --sink")
+
+    directory = args.directory
+    #queries = ["NSCLC AND adagrasib", "NSCLC AND sotorasib","NSCLC AND amivantamb","NSCLC AND mobocertinib"]
+    queries = QueryGrid([
+        ["GSTP1", "HOXA9", "MLH1", "MSH2", "PTEN", "RASSF1", "RUNX3"],
+        ["Breast cancer", "Colorectal cancer", "Lung cancer", "Melanoma", "Prostate cancer"],
+        "DNA methylation",
+        "patient",
+        ["sequencing", "PCR", "microarray"],
+    ])
+    
+
+
+    output_csv_path = args.output
+
+    search_options = dict(processes=args.processes, chunksize=args.chunksize, unordered=args.unordered,
+                          stream_threshold=args.stream_threshold * 1024 * 1024,
+                          chunk_size=args.chunk_size * 1024 * 1024, signatures=args.signatures)
+    if args.sink:
+        sink = search_to_sink(directory, queries, args.sink, args.ignore_case, args.resume, **search_options)
+        sink.save_statistics(output_csv_path)
+        print(f"Counts of {sink.aggregates.files} files are in {args.sink}")
+        print("Results have been saved to CSV at:", output_csv_path)
+        return
+
+    profile = Profile() if args.profile else None
+    if profile is not None:
+        matrix, files, queries = profile_search(directory, queries, profile, args.ignore_case, args.processes,
+                                                args.chunksize, args.unordered)
+    elif args.cache:
+        matrix, files, queries = cached_search_to_matrix(directory, queries, args.cache, args.ignore_case,
+                                                         args.cache_size * 1024 * 1024, **search_options)
+    else:
+        snippet_options = SnippetOptions(args.snippet_threshold, args.snippet_window, args.snippet_limit)
+        matrix, files, queries = search_engine.search_to_matrix(directory, queries, ignore_case=args.ignore_case,
+                                                                snippets_path=args.snippets,
+                                                                snippet_options=snippet_options, **search_options)
+    with profile.stage('export') if profile is not None else nullcontext():
+        save_matrix(output_csv_path.replace('.csv', '_matrix.npz'), matrix, files, queries)
+        save_matrix_statistics_to_csv(matrix, queries, output_csv_path)
+
+    print("Results have been saved to CSV at:", output_csv_path)
+    if profile is not None:
+        profile.save(args.profile, queries, args.trace)
+        print("Profile has been saved to JSON at:", args.profile)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+import io
+import os
+import codecs
+from array import array
+from collections import defaultdict, Counter
+from multiprocessing import Pool, cpu_count
+from contextlib import closing, nullcontext
+from tqdm import tqdm
+
+import numpy as np
+
+from corpus_pack import PackedCorpus, decode_text, is_pack
+from doc_signatures import load_signatures
+from query_compiler import compile_queries, count_terms, count_terms_stream, locate_terms
+from query_grid import QueryGrid
+from snippets import DEFAULT_SNIPPET_OPTIONS, extract_snippets, write_snippets
+
+# Files larger than this many bytes are searched in chunks instead of being
+# read whole, and the chunk size in bytes.
+STREAM_THRESHOLD = 64 * 1024 * 1024
+CHUNK_SIZE = 4 * 1024 * 1024
+
+# Compiled queries and streaming settings of the current worker process, set
+# once by init_worker so that tasks only carry a file path.
+worker_compiled = None
+worker_stream_threshold = STREAM_THRESHOLD
+worker_chunk_size = CHUNK_SIZE
+# Pack opened by the current worker process on its first block.
+worker_pack = None
+# File paths (or pack names) whose signatures rule out every query.
+worker_skip = frozenset()
+# SnippetOptions when results should carry snippets, else None.
+worker_snippets = None
+
+
+def init_worker(compiled, stream_threshold=STREAM_THRESHOLD, chunk_size=CHUNK_SIZE, skip=frozenset(), snippets=None):
+    global worker_compiled, worker_stream_threshold, worker_chunk_size, worker_pack, worker_skip, worker_snippets
+    worker_compiled = compiled
+    worker_stream_threshold = stream_threshold
+    worker_chunk_size = chunk_size
+    worker_skip = skip
+    worker_snippets = snippets
+    if worker_pack is not None:
+        worker_pack.close()
+        worker_pack = None
+
+
+def read_chunks(file_path, chunk_size=CHUNK_SIZE, digest=None):
+    """
+    Yield the text of a UTF-8 file in pieces of at most chunk_size bytes.
+
+    Decoding and newline translation match open(file_path, 'r',
+    encoding='utf-8'). If digest is given (e.g. hashlib.sha256()), it is
+    updated with the raw bytes as they are read.
+    """
+    decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder('utf-8')(), translate=True)
+    with open(file_path, 'rb') as f:
+        while True:
+            data = f.read(chunk_size)
+            if digest is not None:
+                digest.update(data)
+            text = decoder.decode(data, final=not data)
+            if text:
+                yield text
+            if not data:
+                break
+
+
+def decode_chunks(chunks):
+    """Yield the text of UTF-8 byte chunks, decoded and newline-translated as read_chunks does."""
+    decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder('utf-8')(), translate=True)
+    for data in chunks:
+        text = decoder.decode(data)
+        if text:
+            yield text
+    text = decoder.decode(b'', final=True)
+    if text:
+        yield text
+
+
+def search_content(compiled, content):
+    # NEAR and SENTENCE need match positions, plain queries only term counts.
+    if compiled.positional:
+        return compiled.evaluate(*locate_terms(compiled, content))
+    return compiled.evaluate(count_terms(compiled, content))
+
+
+def search_result(file, counts, content=None):
+    # With snippet options, results carry the file's snippets as a third item.
+    # They are cut from the text already in memory, and only when a count
+    # reaches the threshold; streamed files have no snippets.
+    if worker_snippets is None:
+        return (file, counts)
+    snippets = []
+    if content is not None:
+        try:
+            snippets = extract_snippets(worker_compiled, content, counts, worker_snippets)
+        except Exception as e:
+            print(f"Error extracting snippets of {file}: {e}")
+    return (file, counts, snippets)
+
+
+def search_file(task):
+    """
+    Count every query in one file with the worker's compiled queries.
+
+    Returns:
+        tuple: (filename, compact array of query counts in compiled.queries order),
+            plus the list of snippets if the worker has snippet options
+    """
+    file_path, file = task
+    compiled = worker_compiled
+    if file_path in worker_skip:
+        return search_result(file, array('l', [0]) * len(compiled.queries))
+    content = None
+    try:
+        # NEAR and SENTENCE need match positions, so those queries always read the whole file.
+        if (not compiled.positional and worker_stream_threshold is not None
+                and os.path.getsize(file_path) > worker_stream_threshold):
+            counts = compiled.evaluate(count_terms_stream(compiled, read_chunks(file_path, worker_chunk_size)))
+        else:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+            counts = search_content(compiled, content)
+    except Exception as e:
+        print(f"Error processing file {file_path}: {e}")
+        counts = array('l', [0]) * len(compiled.queries)
+    return search_result(file, counts, content)
+
+
+def search_block(task):
+    """
+    Count every query in each paper of one block of a corpus pack.
+
+    The block is decompressed whole, except that a paper above the worker's
+    stream threshold is decompressed and searched in chunks like a large
+    file in a folder. pack_directory gives a paper larger than the block
+    size a block of its own, so with a block size below the stream
+    threshold worker memory stays bounded.
+
+    Returns:
+        list: search_file's result per paper of the block, in pack order,
+            named by the paper's path in the packed folder
+    """
+    global worker_pack
+    pack_path, block = task
+    compiled = worker_compiled
+    if worker_pack is None or worker_pack.pack_path != pack_path:
+        worker_pack = PackedCorpus(pack_path)
+    files = worker_pack.block_files[block]
+    if all(name in worker_skip for name, _, _ in files):
+        return [search_result(name, array('l', [0]) * len(compiled.queries)) for name, _, _ in files]
+    if (len(files) == 1 and not compiled.positional and worker_stream_threshold is not None
+            and files[0][2] > worker_stream_threshold):
+        name = files[0][0]
+        try:
+            chunks = decode_chunks(worker_pack.iter_block_bytes(block, worker_chunk_size))
+            counts = compiled.evaluate(count_terms_stream(compiled, chunks))
+        except Exception as e:
+            print(f"Error processing file {name}: {e}")
+            counts = array('l', [0]) * len(compiled.queries)
+        return [search_result(name, counts)]
+    results = []
+    data = worker_pack.read_block(block)
+    for name, start, length in files:
+        if name in worker_skip:
+            results.append(search_result(name, array('l', [0]) * len(compiled.queries)))
+            continue
+        content = None
+        try:
+            content = decode_text(data[start:start + length])
+            counts = search_content(compiled, content)
+        except Exception as e:
+            print(f"Error processing file {name}: {e}")
+            counts = array('l', [0]) * len(compiled.queries)
+        results.append(search_result(name, counts, content))
+    return results
+
+
+def find_text_files(directory, relative_paths=False):
+    """(file path, name) of every .txt file under directory, named by filename or by relative path."""
+    file_infos = []
+    for root, dirs, files in os.walk(directory):
+        for file in files:
+            if file.endswith('.txt'):
+                file_path = os.path.join(root, file)
+                file_infos.append((file_path, os.path.relpath(file_path, directory) if relative_paths else file))
+    return file_infos
+
+
+def pack_result_name(name, relative_paths):
+    return name if relative_paths else os.path.basename(name)
+
+
+def default_chunksize(task_count, processes):
+    # Same split as Pool.map: about four chunks per worker.
+    chunksize, extra = divmod(task_count, processes * 4)
+    return chunksize + 1 if extra else max(chunksize, 1)
+
+
+def iter_search(tasks, compiled, processes=None, chunksize=None, unordered=False,
+                stream_threshold=STREAM_THRESHOLD, chunk_size=CHUNK_SIZE, skip=frozenset(), snippets=None):
+    """
+    Search files in a worker pool and yield search_file's result per file.
+
+    Args:
+        tasks (list): (file path, filename) pairs
+        compiled (CompiledQueries or CompiledGrid): Sent to each worker once, at start-up
+        processes (int): Worker processes, defaults to cpu_count()
+        chunksize (int): Files per task message, defaults to default_chunksize
+        unordered (bool): Yield files as they complete instead of in task order
+        stream_threshold (int): Files above this many bytes are read in chunks
+            of chunk_size bytes, so worker memory stays bounded; 0 streams
+            every file and None never streams
+        skip (set): File paths to count as zero without reading them
+        snippets (SnippetOptions): Also yield the snippets of each file
+    """
+    processes = processes or cpu_count()
+    chunksize = chunksize or default_chunksize(len(tasks), processes)
+
+    if processes == 1:
+        init_worker(compiled, stream_threshold, chunk_size, skip, snippets)
+        for task in tqdm(tasks, desc="Processing files"):
+            yield search_file(task)
+        return
+
+    with closing(Pool(processes, initializer=init_worker, initargs=(compiled, stream_threshold, chunk_size, skip, snippets))) as pool:
+        imap = pool.imap_unordered if unordered else pool.imap
+        for result in tqdm(imap(search_file, tasks, chunksize), total=len(tasks), desc="Processing files"):
+            yield result
+
+
+def iter_search_pack(pack_path, compiled, processes=None, chunksize=None, unordered=False,
+                     stream_threshold=STREAM_THRESHOLD, chunk_size=CHUNK_SIZE, skip=frozenset(), snippets=None,
+                     relative_paths=False):
+    """
+    Search the papers of a corpus pack and yield search_file's result per paper.
+
+    Each task is one block, so workers read the pack sequentially in large
+    pieces instead of opening one file per paper. stream_threshold and
+    chunk_size apply to papers packed alone in a block, as in search_block.
+    Results are named by filename, or with relative_paths by pack name.
+    """
+    with PackedCorpus(pack_path) as pack:
+        total = len(pack)
+        tasks = [(pack_path, block) for block in range(len(pack.blocks))]
+    processes = processes or cpu_count()
+    chunksize = chunksize or default_chunksize(len(tasks), processes)
+
+    with tqdm(total=total, desc="Processing files") as progress:
+        if processes == 1:
+            init_worker(compiled, stream_threshold, chunk_size, skip, snippets)
+            for task in tasks:
+                results = search_block(task)
+                progress.update(len(results))
+                for result in results:
+                    yield (pack_result_name(result[0], relative_paths),) + result[1:]
+            return
+
+        with closing(Pool(processes, initializer=init_worker, initargs=(compiled, stream_threshold, chunk_size, skip, snippets))) as pool:
+            imap = pool.imap_unordered if unordered else pool.imap
+            for results in imap(search_block, tasks, chunksize):
+                progress.update(len(results))
+                for result in results:
+                    yield (pack_result_name(result[0], relative_paths),) + result[1:]
+
+
+def iter_corpus(directory, compiled, processes=None, chunksize=None, unordered=False,
+                stream_threshold=STREAM_THRESHOLD, chunk_size=CHUNK_SIZE, signatures=None, snippets=None,
+                exclude=frozenset(), relative_paths=False):
+    """
+    Search a folder of .txt papers or a .pack file written by corpus_pack.py.
+
+    If signatures (a doc_signatures.py file) is given, papers whose trigram
+    filter rules out every query are counted as zero without being read.
+    Results are named by filename, or with relative_paths by path relative
+    to directory (the pack name in a pack), which tells apart papers of
+    different subfolders sharing a filename. Papers whose name is in
+    exclude are left out of the results.
+
+    Returns:
+        tuple: (number of files, iterator of search_file results)
+    """
+    skip = frozenset()
+    if signatures:
+        skip = frozenset(load_signatures(signatures).rejected(compiled, directory))
+    if is_pack(directory):
+        with PackedCorpus(directory) as pack:
+            total = sum(1 for name in pack.files if pack_result_name(name, relative_paths) not in exclude)
+        search = iter_search_pack(directory, compiled, processes, chunksize, unordered, stream_threshold, chunk_size,
+                                  skip, snippets, relative_paths)
+        if exclude:
+            # Blocks are searched whole, so excluded papers are only dropped from the results.
+            search = (result for result in search if result[0] not in exclude)
+        return total, search
+    tasks = [task for task in find_text_files(directory, relative_paths) if task[1] not in exclude]
+    return len(tasks), iter_search(tasks, compiled, processes, chunksize, unordered, stream_threshold, chunk_size, skip,
+                                   snippets)
+
+
+def process_directory(directory, queries, ignore_case=False, processes=None, chunksize=None, unordered=False, engine='auto',
+                      stream_threshold=STREAM_THRESHOLD, chunk_size=CHUNK_SIZE, signatures=None):
+    """
+    Search every .txt file under directory, or every paper of a .pack file,
+    for every query.
+
+    Returns:
+        defaultdict(Counter): filename -> query counts, as in search_case.py
+    """
+    compiled = compile_queries(queries, ignore_case, engine)
+    _, search = iter_corpus(directory, compiled, processes, chunksize, unordered, stream_threshold, chunk_size, signatures)
+
+    results = defaultdict(Counter)
+    for file, counts in search:
+        results[file].update(dict(zip(compiled.queries, counts)))
+    return results
+
+
+def search_to_matrix(directory, queries, ignore_case=False, processes=None, chunksize=None, unordered=False, engine='auto',
+                     stream_threshold=STREAM_THRESHOLD, chunk_size=CHUNK_SIZE, signatures=None, snippets_path=None,
+                     snippet_options=DEFAULT_SNIPPET_OPTIONS, relative_paths=False):
+    """
+    Search every .txt file (or packed paper) and fill the files x queries matrix directly.
+
+    Rows are named by filename, or with relative_paths by path relative to
+    directory, as in iter_corpus.
+
+    queries may also be a QueryGrid; its queries are then evaluated as a grid
+    and the returned labels are the grid's lazy GridQueries.
+
+    With snippets_path, the context of the matches of every (file, query)
+    pair counted at least snippet_options.threshold times is written there
+    as JSONL, one snippet per line.
+
+    Returns:
+        tuple: (int32 matrix, list of row filenames, list of column queries),
+            as count_matrix.results_to_matrix
+    """
+    if isinstance(queries, QueryGrid):
+        compiled = queries.compile(ignore_case, engine)
+    else:
+        compiled = compile_queries(queries, ignore_case, engine)
+    total, search = iter_corpus(directory, compiled, processes, chunksize, unordered, stream_threshold, chunk_size, signatures,
+                                snippet_options if snippets_path else None, relative_paths=relative_paths)
+
+    matrix = np.zeros((total, len(compiled.queries)), dtype=np.int32)
+    files = []
+    with open(snippets_path, 'w', encoding='utf-8') if snippets_path else nullcontext() as snippet_file:
+        for i, (file, counts, *snippets) in enumerate(search):
+            matrix[i] = counts
+            files.append(file)
+            if snippets and snippets[0]:
+                write_snippets(snippet_file, file, snippets[0])
+    return matrix, files, compiled.queries
@@ -0,0 +1,344 @@
+import os
+import json
+import hashlib
+import argparse
+from bisect import bisect_right
+from collections import defaultdict, Counter
+from multiprocessing import Pool, cpu_count
+from contextlib import closing
+from tqdm import tqdm
+
+from count_matrix import results_to_matrix, save_matrix, save_matrix_statistics_to_csv
+from query_compiler import (TermPositions, WORD_PATTERN, build_terms_matcher, compile_queries, evaluate_all,
+                            offsets_to_positions, sentence_starts)
+from search_engine import default_chunksize, read_chunks, STREAM_THRESHOLD, CHUNK_SIZE
+
+INDEX_VERSION = 2
+
+
+def read_text(file_path):
+    """
+    Read a paper and hash its raw bytes.
+
+    Newlines are translated like open(file_path, 'r', encoding='utf-8'), so
+    counts match process_file.
+
+    Returns:
+        tuple: (decoded text, SHA-256 hex digest of the file bytes)
+    """
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    content = data.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+    return content, hashlib.sha256(data).hexdigest()
+
+
+# (term labels, matcher) pairs for all and for new terms of the current worker
+# process and whether positions are indexed, set once by init_index_worker.
+worker_matchers = ((), None), ((), None)
+worker_positional = False
+
+
+def init_index_worker(all_terms, all_matcher, new_terms, new_matcher, positional=False):
+    global worker_matchers, worker_positional
+    worker_matchers = (all_terms, all_matcher), (new_terms, new_matcher)
+    worker_positional = positional
+
+
+def index_file(task):
+    file_path, file, size, mtime_ns, entry = task
+    (all_terms, all_matcher), (new_terms, new_matcher) = worker_matchers
+    positional = worker_positional
+    try:
+        if size > STREAM_THRESHOLD and all_matcher is not None and not positional:
+            # Too large to hold in memory: count every term while hashing.
+            digest = hashlib.sha256()
+            term_counts = all_matcher.count_stream(read_chunks(file_path, CHUNK_SIZE, digest))
+            counts = {term: count for term, count in zip(all_terms, term_counts) if count}
+            return (file, {'size': size, 'mtime_ns': mtime_ns, 'sha256': digest.hexdigest(), 'counts': counts})
+        content, sha256 = read_text(file_path)
+    except Exception as e:
+        print(f"Error processing file {file_path}: {e}")
+        return (file, None)
+
+    # Unchanged content keeps its cached counts and only needs the new terms.
+    if entry is not None and entry['sha256'] == sha256 and (not positional or 'positions' in entry):
+        counts = dict(entry['counts'])
+        positions = dict(entry.get('positions', {}))
+        terms, matcher = new_terms, new_matcher
+    else:
+        counts = {}
+        positions = {}
+        terms, matcher = all_terms, all_matcher
+
+    sentences = sentence_starts(content) if positional else None
+    if matcher is not None and positional:
+        word_starts = [match.start() for match in WORD_PATTERN.finditer(content)]
+        for term, offsets in zip(terms, matcher.locate(content)):
+            if offsets:
+                counts[term] = len(offsets)
+                words = offsets_to_positions(offsets, word_starts, sentences).words
+                positions[term] = [[offset, word] for offset, word in zip(offsets, words)]
+    elif matcher is not None:
+        for term, count in zip(terms, matcher.count(content)):
+            if count:
+                counts[term] = count
+
+    entry = {'size': size, 'mtime_ns': mtime_ns, 'sha256': sha256, 'counts': counts}
+    if positional:
+        entry['sentences'] = sentences
+        entry['positions'] = positions
+    return (file, entry)
+
+
+def new_index(ignore_case=False, positional=False):
+    """
+    Args:
+        ignore_case (bool): Default case mode of the indexed terms
+        positional (bool): Also store, per file, the sentence start offsets and
+            the offset and word number of every match, for NEAR and SENTENCE
+    """
+    return {
+        'version': INDEX_VERSION,
+        'ignore_case': ignore_case,
+        'positional': positional,
+        'terms': [],
+        'files': {},
+    }
+
+
+def refresh_index(index, directory, queries, processes=None, chunksize=None):
+    """
+    Bring the index up to date with the corpus and the terms of the queries.
+
+    The index doubles as a manifest: each file keeps its size, mtime, content
+    hash and term counts (plus term positions in a positional index). Only
+    new files, files whose size or mtime changed and, when the queries add
+    terms, files missing those terms are read. Files that no longer exist are
+    dropped.
+
+    Args:
+        index (dict): Index from new_index or load_index, updated in place
+        directory (str): Folder containing the converted .txt papers
+        queries (list): Queries whose terms must be indexed
+        processes (int): Worker processes, defaults to cpu_count()
+        chunksize (int): Files per task message, defaults to about four per worker
+
+    Returns:
+        dict: Number of added, changed, removed and unchanged files
+    """
+    ignore_case = index['ignore_case']
+    known_terms = set(index['terms'])
+    new_terms = [term for term in compile_queries(queries, ignore_case).terms if term not in known_terms]
+    terms = index['terms'] + new_terms
+    all_matcher = build_terms_matcher(terms, ignore_case) if terms else None
+    new_matcher = build_terms_matcher(new_terms, ignore_case) if new_terms else None
+
+    stats = {'added': 0, 'changed': 0, 'removed': 0, 'unchanged': 0}
+    seen = set()
+    tasks = []
+    for root, dirs, files in os.walk(directory):
+        for file in files:
+            if file.endswith('.txt'):
+                file_path = os.path.join(root, file)
+                rel_path = os.path.relpath(file_path, directory)
+                seen.add(rel_path)
+                stat = os.stat(file_path)
+                entry = index['files'].get(rel_path)
+                if entry is None:
+                    stats['added'] += 1
+                elif entry['size'] != stat.st_size or entry['mtime_ns'] != stat.st_mtime_ns:
+                    stats['changed'] += 1
+                elif index.get('positional') and 'positions' not in entry:
+                    stats['changed'] += 1
+                else:
+                    stats['unchanged'] += 1
+                    if not new_terms:
+                        continue
+                tasks.append((file_path, rel_path, stat.st_size, stat.st_mtime_ns, entry))
+
+    for rel_path in [rel_path for rel_path in index['files'] if rel_path not in seen]:
+        del index['files'][rel_path]
+        stats['removed'] += 1
+
+    if tasks:
+        processes = processes or cpu_count()
+        chunksize = chunksize or default_chunksize(len(tasks), processes)
+        with closing(Pool(processes, initializer=init_index_worker, initargs=(terms, all_matcher, new_terms, new_matcher, index.get('positional', False)))) as pool:
+            for rel_path, entry in tqdm(pool.imap_unordered(index_file, tasks, chunksize), total=len(tasks), desc="Indexing files"):
+                if entry is None:
+                    index['files'].pop(rel_path, None)
+                else:
+                    index['files'][rel_path] = entry
+
+    index['terms'] = terms
+    return stats
+
+
+def build_index(directory, queries, ignore_case=False, processes=None, chunksize=None, positional=False):
+    """
+    Scan the corpus once and record per-file occurrence counts of every term.
+
+    Args:
+        directory (str): Folder containing the converted .txt papers
+        queries (list): Queries whose terms should be indexed
+        ignore_case (bool): Count like search_nocase.py instead of search_case.py
+        positional (bool): Store term positions for NEAR and SENTENCE queries
+
+    Returns:
+        dict: Index with the indexed terms and, per file, its size, mtime,
+            content hash and nonzero term counts
+    """
+    index = new_index(ignore_case, positional)
+    refresh_index(index, directory, queries, processes, chunksize)
+    return index
+
+
+def save_index(index, index_path):
+    folder = os.path.dirname(index_path)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+    tmp_path = index_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f)
+    os.replace(tmp_path, index_path)
+
+
+def load_index(index_path):
+    with open(index_path, 'r', encoding='utf-8') as f:
+        index = json.load(f)
+    if index.get('version') != INDEX_VERSION:
+        raise ValueError(f"Unsupported index version in {index_path}: {index.get('version')}, rebuild the index")
+    return index
+
+
+def index_positions(entry, terms):
+    """TermPositions of each term from the offsets and word numbers stored for one file."""
+    sentences = entry['sentences']
+    positions = []
+    for term in terms:
+        matches = entry['positions'].get(term, [])
+        words = [word for _, word in matches]
+        sentence_ids = [bisect_right(sentences, offset) - 1 for offset, _ in matches]
+        positions.append(TermPositions(words, sentence_ids))
+    return positions
+
+
+def query_index(index, queries):
+    """
+    Answer queries from the index alone, without reading any .txt file.
+
+    Returns:
+        defaultdict(Counter): Same shape as process_directory, so the result
+            can be passed to results_to_matrix
+    """
+    compiled = compile_queries(queries, index['ignore_case'])
+    known_terms = set(index['terms'])
+    missing = [term for term in compiled.terms if term not in known_terms]
+    if missing:
+        raise KeyError(f"Terms not in index, rebuild it with these queries: {missing}")
+    if compiled.positional and not index.get('positional'):
+        raise ValueError("NEAR and SENTENCE queries need an index built with positional=True")
+
+    results = defaultdict(Counter)
+    for file, entry in index['files'].items():
+        file_results = results[file]
+        counts = [entry['counts'].get(term, 0) for term in compiled.terms]
+        if any(counts):
+            positions = index_positions(entry, compiled.terms) if compiled.positional else None
+            for query, count in zip(compiled.queries, evaluate_all(compiled, counts, positions)):
+                if count:
+                    file_results[query] = count
+
+    return results
+
+
+def search_incremental(directory, queries, index_path, ignore_case=False, processes=None, chunksize=None,
+                       positional=False):
+    """
+    Search the corpus, reusing the index at index_path for unchanged files.
+
+    Returns:
+        defaultdict(Counter): Same shape as process_directory
+    """
+    if os.path.exists(index_path):
+        index = load_index(index_path)
+        if index['ignore_case'] != ignore_case:
+            raise ValueError(f"{index_path} was built with ignore_case={index['ignore_case']}")
+        index['positional'] = index.get('positional', False) or positional
+    else:
+        index = new_index(ignore_case, positional)
+
+    stats = refresh_index(index, directory, queries, processes, chunksize)
+    save_index(index, index_path)
+    print(f"Index refreshed: {stats['added']} added, {stats['changed']} changed, "
+          f"{stats['removed']} removed, {stats['unchanged']} unchanged")
+    return query_index(index, queries)
+
+
+def read_queries(queries_path):
+    with open(queries_path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or query a term index of the .txt corpus.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='Create or refresh the index from the corpus.')
+    build_parser.add_argument('--directory', type=str, required=True, help='Folder containing the .txt papers.')
+    build_parser.add_argument('--queries', type=str, required=True, help='Txt file with one query per line.')
+    build_parser.add_argument('--index', type=str, required=True, help='Path of the index file to write.')
+    build_parser.add_argument('--ignore-case', action='store_true', help='Count terms case-insensitively.')
+    build_parser.add_argument('--positional', action='store_true', help='Store term positions for NEAR and SENTENCE queries.')
+    build_parser.add_argument('--processes', type=int, default=None, help='Worker processes, defaults to the number of cores.')
+    build_parser.add_argument('--chunksize', type=int, default=None, help='Files sent to a worker per task.')
+
+    query_parser = subparsers.add_parser('query', help='Answer queries from an existing index.')
+    query_parser.add_argument('--index', type=str, required=True, help='Path of the index file.')
+    query_parser.add_argument('--queries', type=str, required=True, help='Txt file with one query per line.')
+    query_parser.add_argument('--output', type=str, required=True, help='Path of the statistics CSV.')
+    query_parser.add_argument('--matrix', type=str, help='Also save the files x queries matrix (.npz or .parquet).')
+    query_parser.add_argument('--thresholds', type=int, nargs='*', default=[], help='Extra thresholds for the _thresholds CSV.')
+
+    search_parser = subparsers.add_parser('search', help='Refresh the index, then answer the queries from it.')
+    search_parser.add_argument('--directory', type=str, required=True, help='Folder containing the .txt papers.')
+    search_parser.add_argument('--queries', type=str, required=True, help='Txt file with one query per line.')
+    search_parser.add_argument('--index', type=str, required=True, help='Path of the index file.')
+    search_parser.add_argument('--output', type=str, required=True, help='Path of the statistics CSV.')
+    search_parser.add_argument('--matrix', type=str, help='Also save the files x queries matrix (.npz or .parquet).')
+    search_parser.add_argument('--thresholds', type=int, nargs='*', default=[], help='Extra thresholds for the _thresholds CSV.')
+    search_parser.add_argument('--ignore-case', action='store_true', help='Count terms case-insensitively.')
+    search_parser.add_argument('--positional', action='store_true', help='Store term positions for NEAR and SENTENCE queries.')
+    search_parser.add_argument('--processes', type=int, default=None, help='Worker processes, defaults to the number of cores.')
+    search_parser.add_argument('--chunksize', type=int, default=None, help='Files sent to a worker per task.')
+
+    args = parser.parse_args()
+    queries = read_queries(args.queries)
+
+    if args.command == 'build':
+        if os.path.exists(args.index):
+            index = load_index(args.index)
+            if index['ignore_case'] != args.ignore_case:
+                parser.error(f"{args.index} was built with ignore_case={index['ignore_case']}")
+            index['positional'] = index.get('positional', False) or args.positional
+        else:
+            index = new_index(args.ignore_case, args.positional)
+        stats = refresh_index(index, args.directory, queries, args.processes, args.chunksize)
+        save_index(index, args.index)
+        print(f"Indexed {len(index['terms'])} terms over {len(index['files'])} files into {args.index} "
+              f"({stats['added']} added, {stats['changed']} changed, {stats['removed']} removed)")
+    else:
+        if args.command == 'query':
+            results = query_index(load_index(args.index), queries)
+        else:
+            results = search_incremental(args.directory, queries, args.index, args.ignore_case,
+                                         args.processes, args.chunksize, args.positional)
+        matrix, files, queries = results_to_matrix(results, queries)
+        if args.matrix:
+            save_matrix(args.matrix, matrix, files, queries)
+        save_matrix_statistics_to_csv(matrix, queries, args.output, thresholds=args.thresholds)
+        print("Results have been saved to CSV at:", args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+import os
+import json
+import time
+import pickle
+import heapq
+from contextlib import closing, contextmanager
+from multiprocessing import Pool, cpu_count
+from tqdm import tqdm
+
+import numpy as np
+
+import search_engine
+from query_compiler import compile_queries, evaluate, locate_terms
+from query_grid import CompiledGrid, QueryGrid
+
+
+def now_us():
+    # perf_counter is system-wide on Linux and Windows, so worker and parent
+    # timestamps share one timeline in the trace.
+    return time.perf_counter_ns() // 1000
+
+
+class Profile:
+    """
+    Wall and CPU time per stage of a search run, plus per-file worker statistics.
+
+    Parent stages (walk, compile, search, export) are timed with stage().
+    Worker stages (read, decode, match, evaluate) arrive with each file's
+    result through add_file() and are summed over all workers.
+    """
+
+    def __init__(self, slowest=20):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.worker_stages = {}
+        self.events = []
+        self.slowest = []
+        self.slowest_count = slowest
+        self.query_costs = None
+        self.files = 0
+        self.bytes_read = 0
+        self.result_bytes = 0
+        self.result_wait = 0.0
+
+    @contextmanager
+    def stage(self, name):
+        start, cpu_start = now_us(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = (now_us() - start) / 1e6, time.process_time() - cpu_start
+            totals = self.stages.setdefault(name, {'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'calls': 0})
+            totals['wall_seconds'] += wall
+            totals['cpu_seconds'] += cpu
+            totals['calls'] += 1
+            self.events.append({'name': name, 'ph': 'X', 'ts': start, 'dur': wall * 1e6, 'pid': os.getpid(), 'tid': 0})
+
+    def add_file(self, file, stats, received):
+        self.files += 1
+        self.bytes_read += stats['bytes']
+        self.result_bytes += stats['result_bytes']
+        self.result_wait += max(received - stats['end'], 0) / 1e6
+        for name, start, wall, cpu in stats['stages']:
+            totals = self.worker_stages.setdefault(name, {'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'calls': 0})
+            totals['wall_seconds'] += wall
+            totals['cpu_seconds'] += cpu
+            totals['calls'] += 1
+            self.events.append({'name': name, 'ph': 'X', 'ts': start, 'dur': wall * 1e6, 'pid': stats['pid'], 'tid': 0,
+                                'args': {'file': file}})
+        if stats['query_costs'] is not None:
+            if self.query_costs is None:
+                self.query_costs = np.zeros(len(stats['query_costs']))
+            self.query_costs += stats['query_costs']
+
+        seconds = (stats['end'] - stats['start']) / 1e6
+        entry = (seconds, file, stats['bytes'], {name: wall for name, _, wall, _ in stats['stages']})
+        if len(self.slowest) < self.slowest_count:
+            heapq.heappush(self.slowest, entry)
+        elif seconds > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, entry)
+
+    def summary(self, queries=None):
+        wall = time.perf_counter() - self.started
+        summary = {
+            'wall_seconds': wall,
+            'files': self.files,
+            'bytes_read': self.bytes_read,
+            'mb_per_second': self.bytes_read / (1024 * 1024) / wall if wall else 0.0,
+            'stages': self.stages,
+            'worker_stages': self.worker_stages,
+            # Delay between a worker finishing a file and the parent receiving
+            # it: pickling, the pipe and waiting for the rest of its chunk.
+            'mean_result_wait_seconds': self.result_wait / self.files if self.files else 0.0,
+            'result_bytes': self.result_bytes,
+            'slowest_files': [{'file': file, 'seconds': seconds, 'bytes': size, 'stages': stages}
+                              for seconds, file, size, stages in sorted(self.slowest, reverse=True)],
+        }
+        if self.query_costs is not None and queries is not None:
+            order = np.argsort(-self.query_costs)
+            summary['query_costs'] = [{'query': queries[j], 'seconds': float(self.query_costs[j])} for j in order]
+        return summary
+
+    def save(self, summary_path, queries=None, trace_path=None):
+        """Write the JSON summary and, if trace_path is given, a Chrome trace (chrome://tracing, Perfetto, speedscope)."""
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(queries), f, indent=2)
+        if trace_path:
+            with open(trace_path, 'w', encoding='utf-8') as f:
+                json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, f)
+
+
+@contextmanager
+def worker_stage(stages, name):
+    start, cpu_start = now_us(), time.process_time()
+    try:
+        yield
+    finally:
+        stages.append((name, start, (now_us() - start) / 1e6, time.process_time() - cpu_start))
+
+
+def grid_query_costs(compiled, node_costs):
+    """
+    Per-query seconds of a CompiledGrid from the seconds of each dimension value.
+
+    A value of a dimension with n values is shared by len(queries) / n
+    queries, and each gets that share of its cost, so the costs add up to
+    the time spent evaluating.
+    """
+    size = len(compiled.queries)
+    queries = np.arange(size)
+    costs = np.zeros(size)
+    for costs_of_values, stride in zip(node_costs, compiled.queries.strides):
+        costs += costs_of_values[queries // stride % len(costs_of_values)] * len(costs_of_values) / size
+    return costs
+
+
+def profile_file(task):
+    """
+    search_file split into timed stages: read, decode, match and evaluate.
+
+    Files are always read whole. Each query's evaluation is also timed:
+    in a query list, subtrees shared by several queries are charged to the
+    first query that evaluates them; in a grid, each dimension value's time
+    is split evenly over the queries that use it (see grid_query_costs).
+
+    Returns:
+        tuple: (filename, query counts, statistics of the file)
+    """
+    file_path, file = task
+    compiled = search_engine.worker_compiled
+    stages = []
+    stats = {'pid': os.getpid(), 'start': now_us(), 'bytes': 0, 'query_costs': None, 'stages': stages}
+    try:
+        with worker_stage(stages, 'read'):
+            with open(file_path, 'rb') as f:
+                data = f.read()
+        stats['bytes'] = len(data)
+        with worker_stage(stages, 'decode'):
+            content = data.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+        with worker_stage(stages, 'match'):
+            if compiled.positional:
+                term_counts, positions = locate_terms(compiled, content)
+            else:
+                term_counts, positions = compiled.matcher.count(content), None
+        with worker_stage(stages, 'evaluate'):
+            if isinstance(compiled, CompiledGrid):
+                node_costs = [np.zeros(len(nodes)) for nodes in compiled.nodes]
+                counts = compiled.evaluate(term_counts, positions, node_costs)
+                stats['query_costs'] = grid_query_costs(compiled, node_costs)
+            else:
+                memo = {}
+                costs = np.zeros(len(compiled.nodes))
+                values = []
+                for j, node in enumerate(compiled.nodes):
+                    start = time.perf_counter()
+                    values.append(evaluate(node, term_counts, memo, positions))
+                    costs[j] = time.perf_counter() - start
+                counts = np.array(values, dtype=np.int64)
+                stats['query_costs'] = costs
+    except Exception as e:
+        print(f"Error processing file {file_path}: {e}")
+        counts = np.zeros(len(compiled.queries), dtype=np.int64)
+    stats['result_bytes'] = len(pickle.dumps((file, counts)))
+    stats['end'] = now_us()
+    return (file, counts, stats)
+
+
+def profile_search(directory, queries, profile, ignore_case=False, processes=None, chunksize=None, unordered=False,
+                   engine='auto'):
+    """
+    search_to_matrix with every stage timed into profile.
+
+    Returns:
+        tuple: (int32 matrix, list of row filenames, list of column queries)
+    """
+    with profile.stage('walk'):
+        tasks = search_engine.find_text_files(directory)
+    with profile.stage('compile'):
+        if isinstance(queries, QueryGrid):
+            compiled = queries.compile(ignore_case, engine)
+        else:
+            compiled = compile_queries(queries, ignore_case, engine)
+
+    processes = processes or cpu_count()
+    chunksize = chunksize or search_engine.default_chunksize(len(tasks), processes)
+    matrix = np.zeros((len(tasks), len(compiled.queries)), dtype=np.int32)
+    files = []
+    with profile.stage('search'):
+        with closing(Pool(processes, initializer=search_engine.init_worker, initargs=(compiled,))) as pool:
+            imap = pool.imap_unordered if unordered else pool.imap
+            for i, (file, counts, stats) in enumerate(tqdm(imap(profile_file, tasks, chunksize), total=len(tasks),
+                                                           desc="Processing files")):
+                profile.add_file(file, stats, now_us())
+                matrix[i] = counts
+                files.append(file)
+    return matrix, files, compiled.queries
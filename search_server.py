@@ -0,0 +1,217 @@
+import os
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from query_compiler import compile_queries
+from search_index import load_index, new_index, query_index, refresh_index, save_index
+
+
+class SearchService:
+    """
+    Term index kept in memory between requests.
+
+    Queries are answered with query_index, so a batch costs no file reads.
+    Queries with terms that are not indexed yet first extend the index with
+    refresh_index, and refresh() picks up added, changed and deleted papers.
+    A refresh works on a copy of the index and only swaps it in when done, so
+    queries keep being answered from the current index meanwhile. The index is
+    saved back to index_path after every refresh that changed it.
+    """
+
+    def __init__(self, directory, index_path, ignore_case=False, positional=False, processes=None, chunksize=None):
+        self.directory = directory
+        self.index_path = index_path
+        self.processes = processes
+        self.chunksize = chunksize
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+        self.last_refresh = None
+        if os.path.exists(index_path):
+            self.index = load_index(index_path)
+            if self.index['ignore_case'] != ignore_case:
+                raise ValueError(f"{index_path} was built with ignore_case={self.index['ignore_case']}")
+            self.index['positional'] = self.index.get('positional', False) or positional
+        else:
+            self.index = new_index(ignore_case, positional)
+
+    def refresh(self, queries=()):
+        """
+        Bring the index up to date with the corpus and the terms of queries.
+
+        Returns:
+            dict: Number of added, changed, removed and unchanged files
+        """
+        with self.refresh_lock:
+            with self.lock:
+                # refresh_index replaces file entries and the term list, it never
+                # changes them in place, so copying the file table is enough.
+                index = dict(self.index, files=dict(self.index['files']))
+            stats = refresh_index(index, self.directory, list(queries), self.processes, self.chunksize)
+            with self.lock:
+                changed = len(index['terms']) != len(self.index['terms'])
+                self.index = index
+                self.last_refresh = time.time()
+            if stats['added'] or stats['changed'] or stats['removed'] or changed:
+                save_index(index, self.index_path)
+        return stats
+
+    def check_queries(self, queries):
+        """
+        Raises:
+            ValueError: If a query cannot be parsed or needs positions the
+                index does not store
+        """
+        if compile_queries(queries, self.index['ignore_case']).positional and not self.index.get('positional'):
+            raise ValueError("NEAR and SENTENCE queries need an index built with positional=True")
+
+    def query(self, queries, refresh=False):
+        """
+        Count a batch of queries over the indexed corpus.
+
+        Returns:
+            dict: 'files' maps each file to its nonzero query counts and
+                'containing' gives the number of files containing each query
+        """
+        if refresh:
+            self.refresh(queries)
+        try:
+            with self.lock:
+                results = query_index(self.index, queries)
+        except KeyError:
+            self.refresh(queries)
+            with self.lock:
+                results = query_index(self.index, queries)
+
+        files = {file: dict(counts) for file, counts in results.items() if counts}
+        containing = {query: 0 for query in queries}
+        for counts in files.values():
+            for query in counts:
+                containing[query] += 1
+        return {'files': files, 'containing': containing}
+
+    def status(self):
+        with self.lock:
+            return {
+                'directory': self.directory,
+                'files': len(self.index['files']),
+                'terms': len(self.index['terms']),
+                'ignore_case': self.index['ignore_case'],
+                'positional': self.index.get('positional', False),
+                'last_refresh': self.last_refresh,
+            }
+
+
+class SearchHandler(BaseHTTPRequestHandler):
+    """
+    JSON API of the search service.
+
+    GET  /status   index size and time of the last refresh
+    POST /query    {"queries": [...], "refresh": false} -> counts per file and query
+    POST /refresh  {"queries": [...]} (optional) -> added/changed/removed/unchanged files
+    """
+
+    service = None
+
+    def do_GET(self):
+        if self.path == '/status':
+            self.send_json(200, self.service.status())
+        else:
+            self.send_json(404, {'error': f"Unknown path: {self.path}"})
+
+    def do_POST(self):
+        if self.path not in ('/query', '/refresh'):
+            self.send_json(404, {'error': f"Unknown path: {self.path}"})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length) or b'{}')
+            if not isinstance(body, dict):
+                raise ValueError("Request body must be a JSON object")
+            queries = body.get('queries', [])
+            if isinstance(queries, str):
+                queries = [queries]
+            if not isinstance(queries, list) or not all(isinstance(query, str) for query in queries):
+                raise ValueError("queries must be a string or a list of strings")
+            self.service.check_queries(queries)
+        except ValueError as e:
+            self.send_json(400, {'error': str(e)})
+            return
+        try:
+            if self.path == '/query':
+                self.send_json(200, self.service.query(queries, body.get('refresh', False)))
+            else:
+                self.send_json(200, self.service.refresh(queries))
+        except Exception as e:
+            self.send_json(500, {'error': str(e)})
+
+    def send_json(self, status, payload):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def refresh_periodically(service, interval):
+    while True:
+        time.sleep(interval)
+        try:
+            stats = service.refresh()
+            if stats['added'] or stats['changed'] or stats['removed']:
+                print(f"Index refreshed: {stats['added']} added, {stats['changed']} changed, "
+                      f"{stats['removed']} removed, {stats['unchanged']} unchanged")
+        except Exception as e:
+            print(f"Error refreshing index: {e}")
+
+
+def serve(service, host='127.0.0.1', port=8765, refresh_interval=None):
+    """
+    Serve the service over HTTP until interrupted.
+
+    Args:
+        service (SearchService): Loaded index to answer from
+        refresh_interval (float): Seconds between automatic refreshes, None to
+            refresh only on request
+    """
+    handler = type('Handler', (SearchHandler,), {'service': service})
+    server = ThreadingHTTPServer((host, port), handler)
+    if refresh_interval:
+        threading.Thread(target=refresh_periodically, args=(service, refresh_interval), daemon=True).start()
+    print(f"Serving {service.directory} on http://{host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Keep the term index in memory and answer queries over HTTP.')
+    parser.add_argument('--directory', type=str, required=True, help='Folder containing the .txt papers.')
+    parser.add_argument('--index', type=str, required=True, help='Path of the index file, created if missing.')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Address to listen on.')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on.')
+    parser.add_argument('--refresh-interval', type=float, default=None, help='Seconds between automatic index refreshes.')
+    parser.add_argument('--ignore-case', action='store_true', help='Count terms case-insensitively.')
+    parser.add_argument('--positional', action='store_true', help='Store term positions for NEAR and SENTENCE queries.')
+    parser.add_argument('--processes', type=int, default=None, help='Worker processes for refreshes, defaults to the number of cores.')
+    parser.add_argument('--chunksize', type=int, default=None, help='Files sent to a worker per task.')
+    args = parser.parse_args()
+
+    service = SearchService(args.directory, args.index, args.ignore_case, args.positional, args.processes, args.chunksize)
+    stats = service.refresh()
+    print(f"Index loaded: {len(service.index['files'])} files, {len(service.index['terms'])} terms "
+          f"({stats['added']} added, {stats['changed']} changed, {stats['removed']} removed)")
+    serve(service, args.host, args.port, args.refresh_interval)
+
+
+if __name__ == "__main__":
+    main()
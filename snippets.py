@@ -0,0 +1,101 @@
+import re
+import json
+from collections import namedtuple
+
+import numpy as np
+
+from query_compiler import Near, Not, Sentence, Term, split_term
+from query_grid import CompiledGrid
+
+# Snippets are cut for (file, query) pairs counted at least threshold times:
+# up to limit matches per pair, each with window characters on either side.
+SnippetOptions = namedtuple('SnippetOptions', ['threshold', 'window', 'limit'])
+DEFAULT_SNIPPET_OPTIONS = SnippetOptions(threshold=5, window=80, limit=5)
+
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+def positive_terms(node, terms=None):
+    """
+    Indices of the terms whose matches make node nonzero.
+
+    The right side of NOT only lowers a count, and NEAR and SENTENCE count
+    matches of their left term, so those are left out.
+    """
+    if terms is None:
+        terms = set()
+    if isinstance(node, Term):
+        terms.add(node.index)
+    elif isinstance(node, (Near, Sentence, Not)):
+        positive_terms(node.left, terms)
+    else:
+        for child in node.children:
+            positive_terms(child, terms)
+    return terms
+
+
+def query_terms(compiled, j):
+    """Positive term indices of query j of CompiledQueries or a CompiledGrid."""
+    if not isinstance(compiled, CompiledGrid):
+        return positive_terms(compiled.nodes[j])
+    terms = set()
+    for nodes, stride in zip(compiled.nodes, compiled.queries.strides):
+        positive_terms(nodes[j // stride % len(nodes)], terms)
+    return terms
+
+
+def byte_offsets(content, offsets):
+    """UTF-8 byte offset of each sorted character offset of content."""
+    if content.isascii():
+        return list(offsets)
+    result = []
+    position = 0
+    byte_position = 0
+    for offset in offsets:
+        byte_position += len(content[position:offset].encode('utf-8'))
+        position = offset
+        result.append(byte_position)
+    return result
+
+
+def extract_snippets(compiled, content, counts, options):
+    """
+    Context windows of the matches of every query counted at least options.threshold times.
+
+    Files below the threshold for every query return at once, so only
+    matching files pay for locating terms and cutting windows.
+
+    Returns:
+        list: One dict per snippet with the query, its count in the file, the
+            matched term, the match's byte offsets in the UTF-8 text (with
+            newlines read as \\n) and the surrounding text on one line
+    """
+    passing = np.flatnonzero(np.asarray(counts) >= options.threshold)
+    if not passing.size:
+        return []
+
+    starts = compiled.matcher.locate(content)
+    snippets = []
+    for j in passing:
+        matches = sorted((start, term) for term in query_terms(compiled, j) for start in starts[term])[:options.limit]
+        ends = [start + len(split_term(compiled.terms[term], compiled.ignore_case)[0]) for start, term in matches]
+        byte_starts = byte_offsets(content, [start for start, _ in matches])
+        byte_ends = [byte_start + len(content[start:end].encode('utf-8'))
+                     for byte_start, (start, _), end in zip(byte_starts, matches, ends)]
+        for (start, term), end, byte_start, byte_end in zip(matches, ends, byte_starts, byte_ends):
+            window = content[max(start - options.window, 0):end + options.window]
+            snippets.append({
+                'query': compiled.queries[j],
+                'count': int(counts[j]),
+                'term': compiled.terms[term],
+                'start': byte_start,
+                'end': byte_end,
+                'snippet': WHITESPACE_PATTERN.sub(' ', window).strip(),
+            })
+    return snippets
+
+
+def write_snippets(f, file, snippets):
+    """Append the snippets of one file to an open JSONL file."""
+    for snippet in snippets:
+        f.write(json.dumps(dict(file=file, **snippet), ensure_ascii=False) + '\n')
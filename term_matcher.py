@@ -0,0 +1,253 @@
+import re
+from collections import deque
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+
+def case_modes(ignore_case, term_count):
+    """Expand ignore_case, a bool or one bool per term, to one bool per term."""
+    if isinstance(ignore_case, bool):
+        return [ignore_case] * term_count
+    return list(ignore_case)
+
+
+class Automaton:
+    """
+    Aho-Corasick automaton over a set of keys.
+
+    keys maps each key to the (term id, key length) pairs it reports. The
+    automaton is built in pure Python. Scanning uses the pyahocorasick C
+    extension when it is installed and falls back to a pure Python loop.
+    """
+
+    def __init__(self, keys):
+        self.overlap = max((len(key) for key in keys), default=1) - 1
+
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [()]
+        for key, outputs in keys.items():
+            state = 0
+            for ch in key:
+                if ch not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append(())
+                    self.goto[state][ch] = len(self.goto) - 1
+                state = self.goto[state][ch]
+            self.out[state] = tuple(outputs)
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(ch, 0)
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+
+        self.automaton = None
+        if ahocorasick is not None and keys:
+            self.automaton = ahocorasick.Automaton()
+            for key, outputs in keys.items():
+                self.automaton.add_word(key, tuple(outputs))
+            self.automaton.make_automaton()
+
+    def matches(self, text):
+        """Yield (end offset, outputs) for every position where a key ends."""
+        if self.automaton is not None:
+            for end_index, outputs in self.automaton.iter(text):
+                yield end_index + 1, outputs
+            return
+
+        goto, fail, out = self.goto, self.fail, self.out
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                yield i + 1, out[state]
+
+
+class AhoCorasickMatcher:
+    """
+    Count every term in a single pass over the text with Aho-Corasick automata.
+
+    Counts follow count_occurrences: matches of one term never overlap and are
+    taken left to right, so "aa" is found twice in "aaaa". ignore_case may be
+    given per term. Case-sensitive terms are matched on the text as is, the
+    others on its lowercased copy (like search_nocase.py), which is computed
+    once per text or chunk however many terms use it.
+    """
+
+    def __init__(self, terms, ignore_case=False):
+        self.terms = list(terms)
+        self.ignore_case = ignore_case
+        self.empty_terms = [i for i, term in enumerate(self.terms) if not term]
+
+        # Several terms can share a key, e.g. "Breast cancer" and
+        # "breast cancer" when case is ignored.
+        exact_keys = {}
+        folded_keys = {}
+        for term_id, (term, fold) in enumerate(zip(self.terms, case_modes(ignore_case, len(self.terms)))):
+            if term:
+                key = term.lower() if fold else term
+                keys = folded_keys if fold else exact_keys
+                keys.setdefault(key, []).append((term_id, len(key)))
+
+        self.automata = [(fold, Automaton(keys)) for fold, keys in ((False, exact_keys), (True, folded_keys)) if keys]
+
+    def count(self, content):
+        """
+        Count all terms in content.
+
+        Returns:
+            list: Occurrence count of each term, in the order of self.terms
+        """
+        return self.count_stream((content,))
+
+    def locate(self, content):
+        """
+        Returns:
+            list: Start offsets of the counted matches of each term
+        """
+        starts = [[] for _ in self.terms]
+        self.count_stream((content,), starts)
+        return starts
+
+    def count_stream(self, chunks, starts=None):
+        """
+        Count all terms in text that arrives in chunks.
+
+        The last overlap characters of each chunk are scanned again in front
+        of the next one. Matches that end inside them were already counted
+        and are skipped, so the counts equal count() on the joined text.
+        If starts is given, the start offset of every counted match is
+        appended to starts[term_id].
+        """
+        counts = [0] * len(self.terms)
+        last_end = [0] * len(self.terms)
+        fold_text = any(fold for fold, _ in self.automata)
+        length = 0
+        tails = [''] * len(self.automata)
+        offsets = [0] * len(self.automata)
+        for chunk in chunks:
+            length += len(chunk)
+            folded = chunk.lower() if fold_text else None
+            for k, (fold, automaton) in enumerate(self.automata):
+                tail = tails[k]
+                text = tail + (folded if fold else chunk)
+                for end, outputs in automaton.matches(text):
+                    if end <= len(tail):
+                        continue
+                    end += offsets[k]
+                    for term_id, term_length in outputs:
+                        if end - term_length >= last_end[term_id]:
+                            counts[term_id] += 1
+                            last_end[term_id] = end
+                            if starts is not None:
+                                starts[term_id].append(end - term_length)
+                keep = min(automaton.overlap, len(text))
+                offsets[k] += len(text) - keep
+                tails[k] = text[len(text) - keep:]
+
+        # re.findall('') matches at every position, including the end.
+        for term_id in self.empty_terms:
+            counts[term_id] = length + 1
+        return counts
+
+
+class RegexMatcher:
+    """
+    Count terms with one precompiled regex per term, like count_occurrences.
+
+    Cheaper than the pure Python automaton for a modest number of
+    case-sensitive terms, because each regex scan runs in C.
+    """
+
+    def __init__(self, terms, ignore_case=False):
+        self.terms = list(terms)
+        self.ignore_case = ignore_case
+        self.patterns = [re.compile(re.escape(term), re.IGNORECASE if fold else 0)
+                         for term, fold in zip(self.terms, case_modes(ignore_case, len(self.terms)))]
+        self.overlap = max((len(term) for term in self.terms), default=1) - 1
+
+    def count(self, content):
+        return [len(pattern.findall(content)) for pattern in self.patterns]
+
+    def locate(self, content):
+        return [[match.start() for match in pattern.finditer(content)] if term else []
+                for term, pattern in zip(self.terms, self.patterns)]
+
+    def count_stream(self, chunks):
+        """
+        Count all terms in text that arrives in chunks, like count() on the joined text.
+
+        Each term resumes its scan at the end of its last counted match, so
+        the last overlap characters kept from the previous chunk are never
+        counted twice.
+        """
+        counts = [0] * len(self.terms)
+        last_end = [0] * len(self.terms)
+        length = 0
+        tail = ''
+        offset = 0
+        for chunk in chunks:
+            length += len(chunk)
+            text = tail + chunk
+            for term_id, pattern in enumerate(self.patterns):
+                if not self.terms[term_id]:
+                    continue
+                for match in pattern.finditer(text, max(last_end[term_id] - offset, 0)):
+                    counts[term_id] += 1
+                    last_end[term_id] = offset + match.end()
+            keep = min(self.overlap, len(text))
+            offset += len(text) - keep
+            tail = text[len(text) - keep:]
+
+        for term_id, term in enumerate(self.terms):
+            if not term:
+                counts[term_id] = length + 1
+        return counts
+
+
+# Above this many case-sensitive terms a single automaton pass beats one C
+# regex scan per term even without pyahocorasick.
+REGEX_TERM_LIMIT = 200
+
+MATCHERS = {
+    'aho-corasick': AhoCorasickMatcher,
+    'regex': RegexMatcher,
+}
+
+
+def build_matcher(terms, ignore_case=False, engine='auto'):
+    """
+    Build the matcher that counts all terms of a query list.
+
+    Args:
+        terms (list): Distinct terms to count
+        ignore_case (bool or list): Count like search_nocase.py, for all terms
+            or per term
+        engine (str): 'aho-corasick', 'regex' or 'auto'. 'auto' picks the
+            automaton when pyahocorasick is installed, when case is ignored
+            for any term (re.IGNORECASE scans are slow) or when there are
+            many terms
+
+    Returns:
+        AhoCorasickMatcher or RegexMatcher
+    """
+    if engine == 'auto':
+        if ahocorasick is not None or any(case_modes(ignore_case, len(terms))) or len(terms) > REGEX_TERM_LIMIT:
+            engine = 'aho-corasick'
+        else:
+            engine = 'regex'
+    if engine not in MATCHERS:
+        raise ValueError(f"Unknown matching engine: {engine}")
+    return MATCHERS[engine](terms, ignore_case)
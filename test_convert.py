@@ -0,0 +1,68 @@
+import os
+import csv
+import time
+
+import pytest
+
+import convert
+from convert import LOG_NAME, convert_pdfs, pdf_tasks
+
+pymupdf = pytest.importorskip('pymupdf')
+
+
+def make_pdf(path, pages):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    doc = pymupdf.open()
+    for text in pages:
+        doc.new_page().insert_text((72, 72), text)
+    doc.save(path)
+    doc.close()
+
+
+def read_log(log_path):
+    with open(log_path, 'r', newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+
+def test_convert_then_skip_up_to_date(tmp_path):
+    pdf_dir, txt_dir = str(tmp_path / 'pdfs'), str(tmp_path / 'txt')
+    make_pdf(os.path.join(pdf_dir, '2020', '10.1_abc.pdf'), ['alpha beta', 'gamma'])
+    log_path = os.path.join(txt_dir, LOG_NAME)
+    os.makedirs(txt_dir)
+
+    counts = convert_pdfs(pdf_tasks(pdf_dir, txt_dir), processes=1, log_path=log_path)
+    assert counts == {'converted': 1, 'skipped': 0, 'error': 0, 'timeout': 0}
+    with open(os.path.join(txt_dir, '2020', '10.1_abc.txt'), 'r', encoding='utf-8') as f:
+        assert f.read().split() == ['alpha', 'beta', 'gamma']
+    rows = read_log(log_path)
+    assert [(row['Status'], row['Pages']) for row in rows] == [('converted', '2')]
+
+    counts = convert_pdfs(pdf_tasks(pdf_dir, txt_dir), processes=1, log_path=log_path)
+    assert counts == {'converted': 0, 'skipped': 1, 'error': 0, 'timeout': 0}
+    assert read_log(log_path) == rows
+
+
+def test_timed_out_and_crashed_workers_are_replaced(tmp_path, monkeypatch):
+    def fake_convert_file(pdf_path, txt_path):
+        name = os.path.basename(pdf_path)
+        if name.startswith('slow'):
+            time.sleep(60)
+        if name.startswith('crash'):
+            os._exit(3)
+        with open(txt_path, 'w', encoding='utf-8') as f:
+            f.write(name)
+        return 1
+
+    # Workers are forked after the patch, so they convert with the fake.
+    monkeypatch.setattr(convert, 'convert_file', fake_convert_file)
+    tasks = [(str(tmp_path / name) + '.pdf', str(tmp_path / name) + '.txt')
+             for name in ('slow', 'fast-1', 'crash', 'fast-2')]
+    for pdf_path, _ in tasks:
+        open(pdf_path, 'wb').close()
+    log_path = str(tmp_path / LOG_NAME)
+
+    counts = convert_pdfs(tasks, processes=1, timeout=0.5, log_path=log_path)
+    assert counts == {'converted': 2, 'skipped': 0, 'error': 1, 'timeout': 1}
+    statuses = {os.path.basename(row['PDF']): row['Status'] for row in read_log(log_path)}
+    assert statuses == {'slow.pdf': 'timeout', 'fast-1.pdf': 'converted', 'crash.pdf': 'error', 'fast-2.pdf': 'converted'}
+    assert os.path.exists(str(tmp_path / 'fast-2.txt'))
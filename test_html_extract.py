@@ -0,0 +1,34 @@
+import os
+
+import pytest
+
+from benchmark_html import PARSERS, check, generate_fixtures, load_pages
+from paper_download import SciHubUrls, getSchiHubPDF
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_pages')
+SAVED_PAGES = [(kind, name, html) for kind, pages in load_pages(PAGES_DIR).items() for name, html in pages]
+
+
+@pytest.mark.parametrize('kind, name, html', SAVED_PAGES, ids=[name for _, name, _ in SAVED_PAGES])
+def test_fast_and_full_parse_agree_on_saved_pages(kind, name, html):
+    assert PARSERS[kind](html) == PARSERS[kind](html, fast=False)
+
+
+def test_saved_pages_cover_every_parser():
+    assert {kind for kind, _, _ in SAVED_PAGES} == set(PARSERS)
+
+
+def test_end_tag_of_enclosing_element_closes_list():
+    html = '<div><ul><li><a href="HTTPS://sci-hub.a"></div><a href="HTTPS://sci-hub.b">x</a>'
+    assert SciHubUrls(html) == SciHubUrls(html, fast=False) == ['HTTPS://sci-hub.a']
+
+
+def test_pdf_link_of_saved_landing_page():
+    with open(os.path.join(PAGES_DIR, 'landing-iframe.html'), 'r', encoding='utf-8') as f:
+        html = f.read()
+    assert getSchiHubPDF(html) == 'HTTPS://zero.sci-hub.se/3920/1f0e5a3b7c9d/smith2011.pdf#navpanes=0&view=FitH'
+
+
+def test_fast_and_full_parse_agree_on_generated_pages(tmp_path):
+    generate_fixtures(str(tmp_path), 50, seed=1)
+    assert check(load_pages(str(tmp_path))) == []
@@ -0,0 +1,122 @@
+import os
+import csv
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from paper_download import downloadPapers
+from pdf_store import PdfStore
+
+PDF = b'%PDF-1.4\n' + b'0' * 4096 + b'\n%%EOF\n'
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Sci-Hub stand-in: /10.1/direct-* answers the PDF itself, /10.1/landing a
+    page whose iframe links /files/landing.pdf, anything else 404.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.in_flight += 1
+            server.peak = max(server.peak, server.in_flight)
+        try:
+            time.sleep(server.delay)
+            if self.path.startswith('/10.1/direct') or self.path == '/files/landing.pdf':
+                self.answer(200, 'application/pdf', PDF)
+            elif self.path == '/10.1/landing':
+                link = f'http://{self.headers["Host"]}/files/landing.pdf'
+                self.answer(200, 'text/html', f'<html><body><iframe id="pdf" src="{link}"></iframe></body></html>'.encode())
+            else:
+                self.answer(404, 'text/html', b'<html><body>Not found</body></html>')
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def answer(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header('content-type', content_type)
+        self.send_header('content-length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    server.lock = threading.Lock()
+    server.in_flight = 0
+    server.peak = 0
+    server.delay = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def read_status(csv_file):
+    with open(csv_file, 'r', newline='') as f:
+        return {row['DOI']: row for row in csv.DictReader(f)}
+
+
+def test_direct_pdf_landing_page_and_missing_doi(server, tmp_path):
+    url = f'http://127.0.0.1:{server.server_port}'
+    dwnl_dir = str(tmp_path / 'pdfs')
+    csv_file = str(tmp_path / 'status.csv')
+    downloadPapers(['10.1/direct', '10.1/landing', '10.1/missing'], dwnl_dir, csv_file, workers=3, mirrors=[url])
+
+    for name in ('10.1_direct.pdf', '10.1_landing.pdf'):
+        with open(os.path.join(dwnl_dir, name), 'rb') as f:
+            assert f.read() == PDF
+    assert not os.path.exists(os.path.join(dwnl_dir, '10.1_missing.pdf'))
+    assert not [name for name in os.listdir(dwnl_dir) if '.part' in name]
+
+    status = read_status(csv_file)
+    assert list(status) == ['10.1/direct', '10.1/landing', '10.1/missing']
+    assert status['10.1/direct']['Status'] == 'True'
+    assert status['10.1/direct']['Bytes'] == str(len(PDF))
+    assert status['10.1/landing']['Status'] == 'True'
+    assert status['10.1/missing']['Status'] == 'False'
+    assert status['10.1/missing']['Modified DOI'] == '10.1_missing'
+
+
+def test_requests_to_one_host_are_capped(server, tmp_path):
+    server.delay = 0.05
+    url = f'http://127.0.0.1:{server.server_port}'
+    dois = [f'10.1/direct-{i}' for i in range(12)]
+    csv_file = str(tmp_path / 'status.csv')
+    downloadPapers(dois, str(tmp_path / 'pdfs'), csv_file, workers=8, per_host=2, mirrors=[url])
+
+    assert server.peak == 2
+    assert all(row['Status'] == 'True' for row in read_status(csv_file).values())
+
+
+def test_failed_store_put_keeps_pdf_and_run_going(server, tmp_path, monkeypatch, capsys):
+    url = f'http://127.0.0.1:{server.server_port}'
+    dwnl_dir = str(tmp_path / 'pdfs')
+    csv_file = str(tmp_path / 'status.csv')
+    put = PdfStore.put
+
+    def put_or_fail(store, doi, path, move=True):
+        if doi == '10.1/direct-a':
+            raise OSError("No space left on device")
+        return put(store, doi, path, move)
+
+    monkeypatch.setattr(PdfStore, 'put', put_or_fail)
+    downloadPapers(['10.1/direct-a', '10.1/direct-b'], dwnl_dir, csv_file, mirrors=[url], store_dir=str(tmp_path / 'store'))
+
+    assert "No space left on device" in capsys.readouterr().out
+    assert os.path.exists(os.path.join(dwnl_dir, '10.1_direct-a.pdf'))
+    assert not os.path.exists(os.path.join(dwnl_dir, '10.1_direct-b.pdf'))
+    with PdfStore(str(tmp_path / 'store')) as store:
+        assert '10.1/direct-a' not in store
+        assert '10.1/direct-b' in store
+    assert all(row['Status'] == 'True' for row in read_status(csv_file).values())
@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+from pdf_store import INDEX_NAME, PdfStore, ingest_directory
+
+PDF = b'%PDF-1.4\nfirst paper\n%%EOF\n'
+OTHER_PDF = b'%PDF-1.4\nsecond paper\n%%EOF\n'
+
+
+def write_pdf(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def test_byte_identical_pdfs_are_stored_once(tmp_path):
+    pdfs = str(tmp_path / 'pdfs')
+    write_pdf(os.path.join(pdfs, '10.1_a.pdf'), PDF)
+    write_pdf(os.path.join(pdfs, '10.1_b.pdf'), PDF)
+    write_pdf(os.path.join(pdfs, '10.1_c.pdf'), OTHER_PDF)
+
+    with PdfStore(str(tmp_path / 'store')) as store:
+        assert ingest_directory(store, pdfs) == (3, 1)
+        assert store.get('10.1/a') == store.get('10.1/b') != store.get('10.1/c')
+        stats = store.stats()
+    assert stats['dois'] == 3
+    assert stats['pdfs'] == 2
+    assert stats['duplicate_dois'] == 1
+    assert stats['saved_bytes'] == len(PDF)
+
+
+def test_index_reloads_after_truncated_last_line(tmp_path):
+    root = str(tmp_path / 'store')
+    with PdfStore(root) as store:
+        store.put('10.1/a', write_pdf(str(tmp_path / 'a.pdf'), PDF))
+        store.put('10.1/c', write_pdf(str(tmp_path / 'c.pdf'), OTHER_PDF))
+    index_path = os.path.join(root, INDEX_NAME)
+    with open(index_path, 'rb') as f:
+        data = f.read()
+    # An interrupted run left the last entry half written.
+    with open(index_path, 'wb') as f:
+        f.write(data[:-10])
+
+    with PdfStore(root) as store:
+        assert '10.1/a' in store
+        assert '10.1/c' not in store
+        store.put('10.1/c', write_pdf(str(tmp_path / 'c.pdf'), OTHER_PDF))
+    with PdfStore(root) as store:
+        assert store.stats()['dois'] == 2
+        with open(store.get('10.1/c'), 'rb') as f:
+            assert f.read() == OTHER_PDF
+
+
+@pytest.mark.parametrize('move', [False, True])
+def test_move_removes_the_source(tmp_path, move):
+    with PdfStore(str(tmp_path / 'store')) as store:
+        first = write_pdf(str(tmp_path / 'first' / '10.1_a.pdf'), PDF)
+        second = write_pdf(str(tmp_path / 'second' / '10.1_b.pdf'), PDF)
+        store.put('10.1/a', first, move)
+        assert store.put('10.1/b', second, move)[1]
+        with open(store.get('10.1/a'), 'rb') as f:
+            assert f.read() == PDF
+    assert os.path.exists(first) != move
+    assert os.path.exists(second) != move
+    assert not [name for name in os.listdir(os.path.dirname(store.get('10.1/a'))) if name.endswith('.tmp')]
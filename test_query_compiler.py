@@ -0,0 +1,24 @@
+import pytest
+
+from query_compiler import And, Not, Or, Sentence, compile_queries, evaluate_all, locate_terms
+
+
+def test_and_and_or_of_same_terms_stay_distinct():
+    compiled = compile_queries(['A AND B', 'A OR B'])
+    assert [type(node) for node in compiled.nodes] == [And, Or]
+    assert evaluate_all(compiled, [3, 0]) == [0, 3]
+
+
+def test_not_and_sentence_of_same_terms_stay_distinct():
+    compiled = compile_queries(['alpha NOT beta', 'alpha SENTENCE beta', '(alpha NOT beta) OR gamma',
+                                '(alpha SENTENCE beta) OR gamma'])
+    assert [type(node) for node in compiled.nodes[:2]] == [Not, Sentence]
+    counts, positions = locate_terms(compiled, "alpha beta. alpha alone. alpha again.")
+    assert compiled.evaluate(counts, positions).tolist() == [2, 1, 2, 1]
+
+
+def test_chained_proximity_is_rejected():
+    with pytest.raises(ValueError):
+        compile_queries(['A NEAR/3 B NEAR/2 C'])
+    with pytest.raises(ValueError):
+        compile_queries(['A SENTENCE B NEAR/2 C'])
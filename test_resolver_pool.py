@@ -0,0 +1,43 @@
+import pytest
+import requests
+
+from resolver_pool import ResolverPool
+
+
+def failing_request(seen):
+    def request(url):
+        seen.append(url)
+        raise requests.ConnectionError(url)
+    return request
+
+
+def test_retries_go_to_untried_endpoints():
+    pool = ResolverPool(['a', 'b', 'c'], retries=2, backoff=0, failure_threshold=100, seed=0)
+    for _ in range(20):
+        seen = []
+        with pytest.raises(requests.ConnectionError):
+            pool.call(failing_request(seen))
+        assert sorted(seen) == ['a', 'b', 'c']
+
+
+def test_retries_fall_back_to_tried_endpoints():
+    pool = ResolverPool(['a', 'b'], retries=3, backoff=0, failure_threshold=100, seed=0)
+    seen = []
+    with pytest.raises(requests.ConnectionError):
+        pool.call(failing_request(seen))
+    assert sorted(seen[:2]) == ['a', 'b']
+    assert len(seen) == 4
+
+
+def test_answer_ends_the_retries():
+    pool = ResolverPool(['a', 'b'], retries=3, backoff=0, seed=0)
+    seen = []
+
+    def request(url):
+        seen.append(url)
+        if len(seen) == 1:
+            raise requests.ConnectionError(url)
+        return url
+
+    assert pool.call(request) != seen[0]
+    assert len(seen) == 2
@@ -0,0 +1,93 @@
+import os
+
+import numpy as np
+
+import result_cache
+from result_cache import ResultCache, cached_search_to_matrix
+from search_engine import search_to_matrix
+
+
+def make_corpus(directory):
+    # Papers named after their DOI often share a filename across subfolders.
+    papers = {
+        os.path.join('2019', '10.1_abc.txt'): 'alpha beta',
+        os.path.join('2020', '10.1_abc.txt'): 'alpha alpha gamma',
+        'other.txt': 'beta gamma gamma',
+    }
+    for name, text in papers.items():
+        path = os.path.join(directory, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+
+def count_searches(monkeypatch, reorder=False):
+    searches = []
+
+    def counting_search(directory, queries, *args, **kwargs):
+        searches.append(list(queries))
+        matrix, files, labels = search_to_matrix(directory, queries, *args, **kwargs)
+        if reorder and len(searches) > 1:
+            # Later searches finish papers in another order, as with --unordered.
+            return matrix[::-1], files[::-1], labels
+        return matrix, files, labels
+
+    monkeypatch.setattr(result_cache, 'search_to_matrix', counting_search)
+    return searches
+
+
+def assert_same_as_search(result, corpus, queries):
+    matrix, files, labels = result
+    expected_matrix, expected_files, expected_labels = search_to_matrix(corpus, queries, processes=1)
+    assert list(labels) == list(expected_labels)
+    assert sorted(zip(files, matrix.tolist())) == sorted(zip(expected_files, expected_matrix.tolist()))
+
+
+def test_full_hit_searches_nothing(tmp_path, monkeypatch):
+    corpus, cache_dir = str(tmp_path / 'corpus'), str(tmp_path / 'cache')
+    make_corpus(corpus)
+    searches = count_searches(monkeypatch)
+    cached_search_to_matrix(corpus, ['alpha', 'beta'], cache_dir, processes=1)
+    result = cached_search_to_matrix(corpus, ['beta', 'alpha'], cache_dir, processes=1)
+    assert searches == [['alpha', 'beta']]
+    assert_same_as_search(result, corpus, ['beta', 'alpha'])
+
+
+def test_partial_hit_with_shared_filenames(tmp_path, monkeypatch):
+    corpus, cache_dir = str(tmp_path / 'corpus'), str(tmp_path / 'cache')
+    make_corpus(corpus)
+    searches = count_searches(monkeypatch, reorder=True)
+    cached_search_to_matrix(corpus, ['alpha'], cache_dir, processes=1)
+    result = cached_search_to_matrix(corpus, ['gamma', 'alpha', 'alpha AND gamma'], cache_dir, processes=1)
+    assert searches == [['alpha'], ['gamma', 'alpha AND gamma']]
+    assert_same_as_search(result, corpus, ['gamma', 'alpha', 'alpha AND gamma'])
+
+
+def test_changed_paper_invalidates_the_cache(tmp_path, monkeypatch):
+    corpus, cache_dir = str(tmp_path / 'corpus'), str(tmp_path / 'cache')
+    make_corpus(corpus)
+    searches = count_searches(monkeypatch)
+    cached_search_to_matrix(corpus, ['alpha'], cache_dir, processes=1)
+    with open(os.path.join(corpus, 'other.txt'), 'a', encoding='utf-8') as f:
+        f.write(' alpha alpha alpha')
+    result = cached_search_to_matrix(corpus, ['alpha'], cache_dir, processes=1)
+    assert searches == [['alpha'], ['alpha']]
+    assert_same_as_search(result, corpus, ['alpha'])
+
+
+def test_evict_removes_least_recently_used_entries(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'), max_bytes=0)
+    column = np.array([0, 3, 1], dtype=np.int32)
+    for key in ('old', 'middle', 'new'):
+        cache.put('corpus', key, column)
+    size = os.path.getsize(cache.path('corpus', 'old'))
+    for age, key in enumerate(('new', 'middle', 'old')):
+        os.utime(cache.path('corpus', key), ns=(1, 10 ** 9 * (100 - age)))
+    # A read makes an entry the most recently used.
+    assert cache.get('corpus', 'old')[1].tolist() == [3, 1]
+
+    cache.max_bytes = 2 * size
+    cache.evict()
+    assert cache.get('corpus', 'middle') is None
+    assert cache.get('corpus', 'new') is not None
+    assert cache.get('corpus', 'old') is not None
@@ -0,0 +1,78 @@
+import os
+
+import numpy as np
+import pytest
+
+import result_sink
+from count_matrix import load_matrix
+from result_sink import search_to_sink
+
+QUERIES = ['alpha', 'beta', 'alpha AND gamma']
+
+
+def make_corpus(directory):
+    # a/x.txt and b/x.txt share a filename but not their counts.
+    papers = {
+        os.path.join('a', 'x.txt'): 'alpha beta gamma',
+        os.path.join('b', 'x.txt'): 'alpha alpha',
+        'one.txt': 'beta beta beta',
+        'two.txt': 'gamma alpha gamma',
+        os.path.join('b', 'three.txt'): 'nothing here',
+    }
+    for name, text in papers.items():
+        path = os.path.join(directory, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+    return papers
+
+
+def read_rows(path):
+    if path.endswith('.npz'):
+        matrix, files, _ = load_matrix(path)
+        return {file: row.tolist() for file, row in zip(files, matrix)}
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read().splitlines()[1:]
+
+
+class Interrupt(Exception):
+    pass
+
+
+@pytest.mark.parametrize('extension', ['.csv', '.jsonl', '.npz'])
+def test_resumed_run_matches_uninterrupted_run(tmp_path, monkeypatch, extension):
+    corpus = str(tmp_path / 'corpus')
+    papers = make_corpus(corpus)
+    full_path = str(tmp_path / ('full' + extension))
+    resumed_path = str(tmp_path / ('resumed' + extension))
+
+    full = search_to_sink(corpus, QUERIES, full_path, processes=1)
+
+    write = result_sink.ResultSink.write
+    written = []
+
+    def write_then_interrupt(sink, file, counts):
+        # Stop right after the first x.txt, so the resumed run must still write the other one.
+        if any(os.path.basename(name) == 'x.txt' for name in written):
+            raise Interrupt
+        written.append(file)
+        write(sink, file, counts)
+
+    monkeypatch.setattr(result_sink.ResultSink, 'write', write_then_interrupt)
+    with pytest.raises(Interrupt):
+        search_to_sink(corpus, QUERIES, resumed_path, processes=1)
+    monkeypatch.setattr(result_sink.ResultSink, 'write', write)
+
+    resumed = search_to_sink(corpus, QUERIES, resumed_path, resume=True, processes=1)
+    assert read_rows(resumed_path) == read_rows(full_path)
+    assert resumed.aggregates.files == full.aggregates.files == len(papers)
+    for threshold, files_at in full.aggregates.files_at.items():
+        assert np.array_equal(resumed.aggregates.files_at[threshold], files_at)
+
+
+def test_fresh_run_keeps_no_file_names(tmp_path):
+    corpus = str(tmp_path / 'corpus')
+    make_corpus(corpus)
+    sink = search_to_sink(corpus, QUERIES, str(tmp_path / 'counts.csv'), processes=1)
+    assert sink.done == set()
+    assert sink.aggregates.files == 5
@@ -0,0 +1,95 @@
+import os
+import json
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import search_server
+from search_server import SearchHandler, SearchService
+
+
+def make_corpus(directory):
+    os.makedirs(directory)
+    for name, text in {'one.txt': 'alpha beta', 'two.txt': 'alpha alpha'}.items():
+        with open(os.path.join(directory, name), 'w', encoding='utf-8') as f:
+            f.write(text)
+
+
+@pytest.fixture
+def service(tmp_path):
+    corpus = str(tmp_path / 'corpus')
+    make_corpus(corpus)
+    service = SearchService(corpus, str(tmp_path / 'index.json'), processes=1)
+    service.refresh(['alpha'])
+    return service
+
+
+@pytest.fixture
+def url(service):
+    handler = type('Handler', (SearchHandler,), {'service': service})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+    server.server_close()
+
+
+def post(url, payload):
+    request = urllib.request.Request(url, data=json.dumps(payload).encode('utf-8'), method='POST')
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_queries_are_answered_while_a_refresh_runs(service, monkeypatch):
+    refresh_index = search_server.refresh_index
+    started, release = threading.Event(), threading.Event()
+
+    def slow_refresh(*args, **kwargs):
+        started.set()
+        release.wait(10)
+        return refresh_index(*args, **kwargs)
+
+    monkeypatch.setattr(search_server, 'refresh_index', slow_refresh)
+    with open(os.path.join(service.directory, 'three.txt'), 'w', encoding='utf-8') as f:
+        f.write('alpha')
+    refresh = threading.Thread(target=service.refresh)
+    refresh.start()
+    started.wait(10)
+
+    answers = []
+    query = threading.Thread(target=lambda: answers.append(service.query(['alpha'])))
+    query.start()
+    query.join(5)
+    answered = not query.is_alive()
+    release.set()
+    refresh.join(10)
+    query.join(10)
+
+    assert answered
+    assert answers[0]['containing'] == {'alpha': 2}
+    assert service.query(['alpha'])['containing'] == {'alpha': 3}
+
+
+def test_status_codes(url, service, monkeypatch):
+    status, payload = post(url + '/query', {'queries': ['alpha']})
+    assert status == 200
+    assert payload['files'] == {'one.txt': {'alpha': 1}, 'two.txt': {'alpha': 2}}
+
+    assert post(url + '/query', {'queries': ['a NEAR/2 b NEAR/2 c']})[0] == 400
+    assert post(url + '/query', {'queries': ['alpha NEAR/2 beta']})[0] == 400
+    assert post(url + '/query', {'queries': [1]})[0] == 400
+    assert post(url + '/query', ['alpha'])[0] == 400
+    assert post(url + '/missing', {})[0] == 404
+
+    def broken_query_index(index, queries):
+        raise OSError("disk gone")
+
+    monkeypatch.setattr(search_server, 'query_index', broken_query_index)
+    assert post(url + '/query', {'queries': ['alpha']}) == (500, {'error': 'disk gone'})